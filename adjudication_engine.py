@@ -2,98 +2,195 @@
 Claim Adjudication Engine - FIXED VERSION v2
 Main logic for approving/rejecting claims
 """
+import itertools
+import operator
+import os
+import re
+import time
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
+from typing import Optional
+from functools import lru_cache
+from rapidfuzz import fuzz
 from document_processor import validate_doctor_registration, check_document_completeness
-from policy_validator import PolicyValidator
+from policy_validator import PolicyValidator, NormalizedClaim
+
+NETWORK_HOSPITALS = ["Apollo", "Fortis", "Max", "Manipal", "Narayana"]
+
+# Matches any network hospital name anywhere in the hospital string
+NETWORK_HOSPITAL_PATTERN = re.compile("|".join(map(re.escape, NETWORK_HOSPITALS)), re.IGNORECASE)
+
+# Excluded-item keyword -> bill field carrying that charge separately
+EXCLUDED_CHARGE_FIELDS = {
+    "whitening": "teeth_whitening",
+    "cosmetic": "teeth_whitening",
+    "weight": "diet_plan",
+    "diet": "diet_plan",
+}
+
+# Fraud rules: (member_info field, comparison, (threshold, score) pairs, highest first).
+# Only the first matching threshold of a rule scores.
+FRAUD_RULES = (
+    ("previous_claims_same_day", operator.ge, ((3, 0.5), (2, 0.3))),  # multiple claims same day
+    ("claims_last_month", operator.ge, ((5, 0.3),)),                  # high claim frequency
+    ("claim_amount", operator.gt, ((4500, 0.1),)),                    # unusually high amount
+)
+
+# Fraud score above which a claim goes to manual review
+FRAUD_THRESHOLD = 0.5
+
+# Similarity (0-100) at which two words of a patient name count as the same word.
+# Tolerates an OCR slip in a longer word ("Aggarwal"/"Agarwal"), but not a one-letter
+# difference between short names ("Mohan"/"Sohan", "Singh"/"Sinha" both score 80)
+NAME_WORD_MIN_RATIO = 85
+
+# Monotonic claim number source, seeded from the start-up time in milliseconds
+_CLAIM_COUNTER = itertools.count(int(time.time() * 1000))
+
+
+def new_claim_id():
+    """Allocate the next claim ID"""
+    return f"CLM_{next(_CLAIM_COUNTER)}"
+
+
+@dataclass(slots=True)
+class AdjudicationDecision:
+    """Decision built up by adjudicate_claim"""
+    claim_id: str
+    decision: str = "PENDING"
+    approved_amount: float = 0
+    rejection_reasons: list = field(default_factory=list)
+    flags: list = field(default_factory=list)
+    confidence_score: float = 0.0
+    notes: str = ""
+    deductions: dict = field(default_factory=dict)
+    next_steps: str = ""
+    # Only reported when applicable
+    rejected_items: Optional[list] = None
+    network_discount: Optional[float] = None
+    
+    def to_dict(self):
+        """Decision as a plain dict, omitting optional fields that were never set"""
+        result = asdict(self)
+        for key in ("rejected_items", "network_discount"):
+            if result[key] is None:
+                del result[key]
+        return result
+
+
+@lru_cache(maxsize=4096)
+def parse_date(value):
+    """Parse a YYYY-MM-DD string to a date (cached: the same dates recur across a day's claims)"""
+    try:
+        return datetime.fromisoformat(value).date()
+    except ValueError:
+        return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def to_date(value):
+    """Dates arrive as date from the API and as YYYY-MM-DD strings from JSON/database rows"""
+    return parse_date(value) if isinstance(value, str) else value
 
 
 class ClaimAdjudicator:
     def __init__(self, policy_path="policy_terms.json"):
-        self.policy_validator = PolicyValidator(policy_path)
-        
-    def adjudicate_claim(self, claim_data, member_info=None):
+        self.policy_path = policy_path
+        self._load_policy()
+    
+    def _load_policy(self):
+        """Build the policy validator and fresh memoised lookups for the current policy file"""
+        self._policy_mtime = os.stat(self.policy_path).st_mtime_ns
+        self.policy_validator = PolicyValidator(self.policy_path)
+        
+        # Policy checks are pure functions of their inputs, and claim traffic repeats the
+        # same diagnoses/treatments/hospitals a lot, so memoise them per policy version
+        self._coverage_cached = lru_cache(maxsize=4096)(self.policy_validator.check_coverage)
+        self._waiting_period_cached = lru_cache(maxsize=4096)(self.policy_validator.check_waiting_period)
+        self._preauth_cached = lru_cache(maxsize=4096)(self.policy_validator.requires_preauth)
+        self._network_hospital_cached = lru_cache(maxsize=1024)(self._is_network_hospital)
+    
+    def _reload_policy_if_changed(self):
+        """Reload policy terms (dropping memoised results) if the policy file was modified"""
+        if os.stat(self.policy_path).st_mtime_ns != self._policy_mtime:
+            self._load_policy()
+    
+    def _check_coverage(self, claim):
+        """Memoised check_coverage"""
+        coverage = self._coverage_cached(claim)
+        # Callers keep excluded_items in the decision, so don't hand out the cached list
+        return {**coverage, "excluded_items": list(coverage["excluded_items"])}
+    
+    def adjudicate_claim(self, claim_data, member_info=None, claim_id=None):
         """
         Main adjudication function - evaluates claim and makes decision
         
         Args:
             claim_data: Structured data from documents
             member_info: Additional member information (join_date, previous_claims, etc.)
+            claim_id: ID allocated up front by the caller (a new one is allocated if omitted)
             
         Returns:
             dict: Adjudication decision with reasoning
         """
-        decision = {
-            "claim_id": f"CLM_{datetime.now().strftime('%Y%m%d%H%M%S')}",
-            "decision": "PENDING",
-            "approved_amount": 0,
-            "rejection_reasons": [],
-            "flags": [],
-            "confidence_score": 0.0,
-            "notes": "",
-            "deductions": {},
-            "next_steps": ""
-        }
+        self._reload_policy_if_changed()
+        
+        decision = AdjudicationDecision(claim_id=claim_id or new_claim_id())
         
         # Step 1: Document Validation
         doc_check = self._validate_documents(claim_data)
         if not doc_check["valid"]:
-            decision["decision"] = "REJECTED"
-            decision["rejection_reasons"] = doc_check["reasons"]
-            decision["confidence_score"] = 1.0
-            decision["notes"] = "Document validation failed"
-            return decision
+            decision.decision = "REJECTED"
+            decision.rejection_reasons = doc_check["reasons"]
+            decision.confidence_score = 1.0
+            decision.notes = "Document validation failed"
+            return decision.to_dict()
         
         # Extract key information
-        prescription = claim_data.get("prescription", {}) or {}
-        bill = claim_data.get("bill", {}) or {}
+        prescription = claim_data.get("prescription") or {}
+        bill = claim_data.get("bill") or {}
+        
+        # Diagnosis/treatments/medicines/tests, normalised once for all policy checks
+        claim = NormalizedClaim.from_documents(prescription, bill)
         
         member_id = member_info.get("member_id") if member_info else None
         member_name = member_info.get("member_name") if member_info else prescription.get("patient_name")
-        treatment_date = member_info.get("treatment_date") if member_info else prescription.get("treatment_date")
+        treatment_date = to_date(member_info.get("treatment_date") if member_info else prescription.get("treatment_date"))
         claim_amount = member_info.get("claim_amount") if member_info else bill.get("total_amount", 0)
         
         # Step 2: Eligibility Check
         eligibility = self.policy_validator.check_member_eligibility(member_id, treatment_date)
         if not eligibility["eligible"]:
-            decision["decision"] = "REJECTED"
-            decision["rejection_reasons"].append(eligibility["reason"])
-            decision["confidence_score"] = 0.98
-            decision["notes"] = "Member eligibility check failed"
-            return decision
+            decision.decision = "REJECTED"
+            decision.rejection_reasons.append(eligibility["reason"])
+            decision.confidence_score = 0.98
+            decision.notes = "Member eligibility check failed"
+            return decision.to_dict()
         
         # Step 3: Waiting Period Check
         if member_info and member_info.get("member_join_date"):
-            diagnosis = prescription.get("diagnosis", "")
-            waiting_check = self.policy_validator.check_waiting_period(
-                member_info["member_join_date"],
+            waiting_check = self._waiting_period_cached(
+                to_date(member_info["member_join_date"]),
                 treatment_date,
-                diagnosis
+                claim.diagnosis_lower
             )
             if not waiting_check["satisfied"]:
-                decision["decision"] = "REJECTED"
-                decision["rejection_reasons"].append("WAITING_PERIOD")
-                decision["confidence_score"] = 0.96
-                decision["notes"] = f"{waiting_check.get('condition', 'Treatment')} has waiting period. Eligible from {waiting_check.get('eligible_date')}"
-                return decision
+                decision.decision = "REJECTED"
+                decision.rejection_reasons.append("WAITING_PERIOD")
+                decision.confidence_score = 0.96
+                decision.notes = f"{waiting_check.get('condition', 'Treatment')} has waiting period. Eligible from {waiting_check.get('eligible_date')}"
+                return decision.to_dict()
         
         # Step 4: Coverage Verification (check exclusions FIRST)
-        diagnosis = prescription.get("diagnosis", "")
-        treatments = prescription.get("procedures", []) or prescription.get("treatment", [])
-        if isinstance(treatments, str):
-            treatments = [treatments]
-        medicines = prescription.get("medicines_prescribed", [])
-        tests = prescription.get("tests_prescribed", []) or bill.get("test_names", [])
-        
-        coverage_check = self.policy_validator.check_coverage(diagnosis, treatments, medicines)
+        coverage_check = self._check_coverage(claim)
         category = coverage_check["category"]
         
         # Check for FULLY excluded treatments (reject immediately)
         if not coverage_check["covered"] and not coverage_check["partial_coverage"]:
-            decision["decision"] = "REJECTED"
-            decision["rejection_reasons"].append("SERVICE_NOT_COVERED")
-            decision["confidence_score"] = 0.97
-            decision["notes"] = f"Treatment/service not covered under policy: {', '.join(coverage_check['excluded_items'])}"
-            return decision
+            decision.decision = "REJECTED"
+            decision.rejection_reasons.append("SERVICE_NOT_COVERED")
+            decision.confidence_score = 0.97
+            decision.notes = f"Treatment/service not covered under policy: {', '.join(coverage_check['excluded_items'])}"
+            return decision.to_dict()
         
         # Step 5: Calculate approved amount EARLY (before fraud/preauth/limits)
         # This is the KEY FIX - we need to know the actual claimable amount early
@@ -104,31 +201,31 @@ class ClaimAdjudicator:
             # Calculate excluded amount
             excluded_amount = self._calculate_excluded_amount(bill, coverage_check["excluded_items"])
             approved_claim_amount = claim_amount - excluded_amount
-            decision["decision"] = "PARTIAL"
-            decision["rejected_items"] = coverage_check["excluded_items"]
-            decision["flags"].append("Contains excluded items")
+            decision.decision = "PARTIAL"
+            decision.rejected_items = coverage_check["excluded_items"]
+            decision.flags.append("Contains excluded items")
         
         # Step 6: Fraud Detection
         fraud_score = self._check_fraud_indicators(claim_data, member_info)
-        if fraud_score > 0.5:
-            decision["decision"] = "MANUAL_REVIEW"
+        if fraud_score > FRAUD_THRESHOLD:
+            decision.decision = "MANUAL_REVIEW"
             if member_info and member_info.get("previous_claims_same_day", 0) >= 2:
-                decision["flags"].append("Multiple claims same day")
-            decision["flags"].append("Unusual pattern detected")
-            decision["confidence_score"] = 0.65
-            decision["notes"] = "Flagged for manual review due to unusual patterns"
-            return decision
+                decision.flags.append("Multiple claims same day")
+            decision.flags.append("Unusual pattern detected")
+            decision.confidence_score = 0.65
+            decision.notes = "Flagged for manual review due to unusual patterns"
+            return decision.to_dict()
         
         # Step 7: Pre-authorization Check (check on approved amount)
-        if self.policy_validator.requires_preauth(treatments, tests):
+        if self._preauth_cached(claim):
             if not member_info or not member_info.get("preauth_obtained"):
                 # Only reject if APPROVED claim amount is high value
                 if approved_claim_amount > 10000:
-                    decision["decision"] = "REJECTED"
-                    decision["rejection_reasons"].append("PRE_AUTH_MISSING")
-                    decision["confidence_score"] = 0.94
-                    decision["notes"] = "Pre-authorization required for MRI/CT scans above ₹10000"
-                    return decision
+                    decision.decision = "REJECTED"
+                    decision.rejection_reasons.append("PRE_AUTH_MISSING")
+                    decision.confidence_score = 0.94
+                    decision.notes = "Pre-authorization required for MRI/CT scans above ₹10000"
+                    return decision.to_dict()
         
         # Step 8: Limit Validation (check on APPROVED amount after exclusions)
         previous_claims = member_info.get("previous_claims_ytd", 0) if member_info else 0
@@ -136,40 +233,40 @@ class ClaimAdjudicator:
         limit_check = self.policy_validator.check_limits(approved_claim_amount, category, previous_claims)
         
         if not limit_check["within_limits"]:
-            decision["decision"] = "REJECTED"
-            decision["rejection_reasons"].append(limit_check["limit_type"])
-            decision["confidence_score"] = 0.98
+            decision.decision = "REJECTED"
+            decision.rejection_reasons.append(limit_check["limit_type"])
+            decision.confidence_score = 0.98
             if excluded_amount > 0:
-                decision["notes"] = f"Even after excluding ₹{excluded_amount}, remaining claim exceeds {limit_check['limit_type']}. Max allowed: ₹{limit_check['max_allowed']}"
+                decision.notes = f"Even after excluding ₹{excluded_amount}, remaining claim exceeds {limit_check['limit_type']}. Max allowed: ₹{limit_check['max_allowed']}"
             else:
-                decision["notes"] = f"Claim exceeds {limit_check['limit_type']}. Max allowed: ₹{limit_check['max_allowed']}"
-            return decision
+                decision.notes = f"Claim exceeds {limit_check['limit_type']}. Max allowed: ₹{limit_check['max_allowed']}"
+            return decision.to_dict()
         
         # Step 9: Calculate Final Amount
         hospital_name = bill.get("hospital_name") or member_info.get("hospital")
-        is_network = self._is_network_hospital(hospital_name)
+        is_network = self._network_hospital_cached(hospital_name)
         copay_calc = self.policy_validator.calculate_copay(approved_claim_amount, category, is_network)
         
-        decision["approved_amount"] = copay_calc["net_payable"]
-        decision["deductions"] = {
+        decision.approved_amount = copay_calc["net_payable"]
+        decision.deductions = {
             "copay": copay_calc["copay_amount"],
             "discount": copay_calc["discount"]
         }
         
         # Add network discount to output if applicable
         if copay_calc["discount"] > 0:
-            decision["network_discount"] = copay_calc["discount"]
+            decision.network_discount = copay_calc["discount"]
         
         # Set final decision
-        if decision["decision"] != "PARTIAL":
-            decision["decision"] = "APPROVED"
-            decision["confidence_score"] = 0.95
+        if decision.decision != "PARTIAL":
+            decision.decision = "APPROVED"
+            decision.confidence_score = 0.95
         else:
-            decision["confidence_score"] = 0.92
+            decision.confidence_score = 0.92
         
-        decision["notes"] = f"Claim processed successfully. Category: {category}"
+        decision.notes = f"Claim processed successfully. Category: {category}"
         
-        return decision
+        return decision.to_dict()
     
     def _validate_documents(self, claim_data):
         """
@@ -222,21 +319,15 @@ class ClaimAdjudicator:
         if not member_info:
             return fraud_score
         
-        # Multiple claims same day (3 or more is very suspicious)
-        same_day_claims = member_info.get("previous_claims_same_day", 0)
-        if same_day_claims >= 3:
-            fraud_score += 0.5
-        elif same_day_claims >= 2:
-            fraud_score += 0.3
-        
-        # High claim frequency
-        if member_info.get("claims_last_month", 0) >= 5:
-            fraud_score += 0.3
-        
-        # Unusually high amounts relative to patterns
-        claim_amount = member_info.get("claim_amount", 0)
-        if claim_amount > 4500:
-            fraud_score += 0.1
+        for attr, compare, thresholds in FRAUD_RULES:
+            value = member_info.get(attr, 0)
+            for threshold, score in thresholds:
+                if compare(value, threshold):
+                    fraud_score += score
+                    break
+            # Already over the review threshold; remaining rules can't change the outcome
+            if fraud_score > FRAUD_THRESHOLD:
+                return 1.0
         
         return min(fraud_score, 1.0)
     
@@ -245,12 +336,7 @@ class ClaimAdjudicator:
         if not hospital_name:
             return False
         
-        network_hospitals = [
-            "Apollo", "Fortis", "Max", "Manipal", "Narayana"
-        ]
-        
-        hospital_lower = hospital_name.lower()
-        return any(net.lower() in hospital_lower for net in network_hospitals)
+        return NETWORK_HOSPITAL_PATTERN.search(hospital_name) is not None
     
     def _calculate_excluded_amount(self, bill, excluded_items):
         """Calculate total amount of excluded items"""
@@ -259,21 +345,19 @@ class ClaimAdjudicator:
         if not bill or not excluded_items:
             return excluded_amount
         
-        # Check bill items
-        items = bill.get("items", [])
-        for item in items:
+        excluded_lower = tuple(excluded.lower() for excluded in excluded_items)
+        
+        # Check bill items (each item counted once, however many exclusions it matches)
+        for item in bill.get("items", []):
             item_name = item.get("name", "").lower()
-            for excluded in excluded_items:
-                if excluded.lower() in item_name:
-                    excluded_amount += item.get("amount", 0)
-        
-        # Check specific charges for cosmetic procedures
-        for excluded in excluded_items:
-            excluded_lower = excluded.lower()
-            if "whitening" in excluded_lower or "cosmetic" in excluded_lower:
-                excluded_amount += bill.get("teeth_whitening", 0)
-            if "weight" in excluded_lower or "diet" in excluded_lower:
-                excluded_amount += bill.get("diet_plan", 0)
+            if any(excluded in item_name for excluded in excluded_lower):
+                excluded_amount += item.get("amount", 0)
+        
+        # Check specific charges for cosmetic procedures / diet plans
+        for excluded in excluded_lower:
+            charge_fields = {charge_field for keyword, charge_field in EXCLUDED_CHARGE_FIELDS.items() if keyword in excluded}
+            for charge_field in charge_fields:
+                excluded_amount += bill.get(charge_field, 0)
         
         return excluded_amount
     
@@ -290,13 +374,18 @@ class ClaimAdjudicator:
         if name1 == name2:
             return True
         
-        # Allow minor variations (e.g., initials)
+        # Allow minor variations (e.g., initials, OCR typos): at least 50% of the
+        # shorter name's words must match a word of the other name
         words1 = set(name1.split())
         words2 = set(name2.split())
-        
-        # At least 50% overlap
-        overlap = len(words1.intersection(words2))
-        return overlap >= min(len(words1), len(words2)) * 0.5
+        if len(words1) > len(words2):
+            words1, words2 = words2, words1
+        
+        overlap = sum(
+            1 for word in words1
+            if word in words2 or any(fuzz.ratio(word, other) >= NAME_WORD_MIN_RATIO for other in words2)
+        )
+        return overlap >= len(words1) * 0.5
     
     def _dates_match(self, date1, date2):
         """Check if two dates are close enough"""
@@ -304,10 +393,8 @@ class ClaimAdjudicator:
             return True
         
         try:
-            if isinstance(date1, str):
-                date1 = datetime.strptime(date1, "%Y-%m-%d")
-            if isinstance(date2, str):
-                date2 = datetime.strptime(date2, "%Y-%m-%d")
+            date1 = to_date(date1)
+            date2 = to_date(date2)
             
             # Allow 1 day difference
             diff = abs((date1 - date2).days)
@@ -5,16 +5,106 @@ Handles OCR extraction using Tesseract and AI-powered data extraction
 import pytesseract
 from PIL import Image
 import pdf2image
+from pdf2image.exceptions import PDFPopplerTimeoutError
 import openai
-import json
+import asyncio
+import hashlib
+import multiprocessing
 import re
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from typing import List, Optional
+from cachetools import LRUCache
 from dotenv import load_dotenv
+from pydantic import BaseModel
 import os
 
 load_dotenv()
 
+# OCR is CPU-bound, so documents of a claim are OCR'd in parallel worker processes
+# (started and stopped with the app, see start_ocr_pool/shutdown_ocr_pool)
+OCR_POOL: Optional[ProcessPoolExecutor] = None
+
+# Limit (seconds) on each poppler/tesseract subprocess: a stuck OCR call is killed
+# inside its worker rather than holding a pool slot after the claim gave up on it
+OCR_CALL_TIMEOUT_SEC = float(os.getenv("OCR_CALL_TIMEOUT_SEC", "20"))
+
+_openai_client = None
+
+# Model used for structured extraction of OCR text
+EXTRACTION_MODEL = "gpt-4o-mini"
+
+# (text digest, document_type) -> parsed extraction, so re-uploads skip the API
+_extraction_cache = LRUCache(maxsize=1024)
+
+# Doctor registration: STATE/NUMBER/YEAR, optionally prefixed by AYUR/HOMEO/UNANI
+DOCTOR_REG_PATTERN = re.compile(r'^(?:(?:AYUR|HOMEO|UNANI)/)?[A-Z]{2,4}/\d{4,6}/\d{4}$')
+
+# Procedure keywords scanned in a single pass over prescription text / bill item names
+PROCEDURE_KEYWORD_PATTERN = re.compile(r"root canal|whiten(?:ing)?|scaling|filling")
+
+# Keyword -> procedure added to the prescription (in priority order)
+PRESCRIPTION_PROCEDURES = {
+    "root canal": "Root Canal Treatment",
+    "whitening": "Teeth Whitening (Cosmetic)",
+    "scaling": "Scaling / Cleaning",
+    "filling": "Dental Filling",
+}
+
+# Keyword -> bill item category (in priority order, first match wins)
+BILL_ITEM_CATEGORIES = {
+    "root canal": "dental",
+    "whiten": "cosmetic",
+    "whitening": "cosmetic",
+    "scaling": "dental",
+    "filling": "dental",
+}
+
 print("Loaded:", os.getenv("OPENAI_API_KEY"))
+
+
+def find_procedure_keywords(text):
+    """Return the set of procedure keywords present in lowercased text"""
+    return {m.group() for m in PROCEDURE_KEYWORD_PATTERN.finditer(text)}
+
+
+def start_ocr_pool():
+    """
+    Start the OCR worker processes
+    
+    Workers come from a forkserver, not a fork of the (multi-threaded) server
+    process, which could copy a lock held by another thread and deadlock.
+    """
+    global OCR_POOL
+    OCR_POOL = ProcessPoolExecutor(
+        max_workers=os.cpu_count(),
+        mp_context=multiprocessing.get_context("forkserver")
+    )
+
+
+def shutdown_ocr_pool():
+    """Stop the OCR worker processes, dropping queued jobs"""
+    global OCR_POOL
+    if OCR_POOL is not None:
+        OCR_POOL.shutdown(cancel_futures=True)
+        OCR_POOL = None
+
+
+def configure_openai_client(http_client):
+    """Send OpenAI requests through the given pooled httpx.AsyncClient (not shared with Supabase)"""
+    global _openai_client
+    _openai_client = openai.AsyncOpenAI(http_client=http_client)
+
+
+def get_openai_client():
+    """Return the shared async OpenAI client, creating it on first use"""
+    global _openai_client
+    if _openai_client is None:
+        _openai_client = openai.AsyncOpenAI()
+    return _openai_client
+
+
 def extract_text_from_document(file_path):
     """
     Extract text from PDF or image using Tesseract OCR
@@ -24,27 +114,102 @@ def extract_text_from_document(file_path):
         
     Returns:
         str: Extracted text content
+        
+    Raises:
+        TimeoutError: If poppler or Tesseract exceeds OCR_CALL_TIMEOUT_SEC
     """
+    # Documents are OCR'd in grayscale: Tesseract binarises internally anyway,
+    # and it is a third of the pixel data of RGB
     try:
         # Check file extension
         if file_path.lower().endswith('.pdf'):
-            # Convert PDF to images
-            images = pdf2image.convert_from_path(file_path)
-            text = ""
-            for image in images:
-                text += pytesseract.image_to_string(image)
-            return text
+            # Convert PDF to images (one pdftoppm process: this already runs in one of
+            # os.cpu_count() OCR pool workers, which keep the CPUs busy between them)
+            images = pdf2image.convert_from_path(
+                file_path, dpi=200, grayscale=True, thread_count=1,
+                timeout=OCR_CALL_TIMEOUT_SEC
+            )
+            if len(images) == 1:
+                return pytesseract.image_to_string(images[0], timeout=OCR_CALL_TIMEOUT_SEC)
+            
+            # OCR all pages in one Tesseract run via a multi-page TIFF
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                tiff_path = os.path.join(tmp_dir, "pages.tif")
+                images[0].save(tiff_path, save_all=True, append_images=images[1:])
+                return pytesseract.image_to_string(tiff_path, timeout=OCR_CALL_TIMEOUT_SEC)
         else:
             # Process as image
-            image = Image.open(file_path)
-            text = pytesseract.image_to_string(image)
-            return text
+            with Image.open(file_path) as image:
+                image.draft("L", image.size)  # JPEGs decode straight to grayscale
+                return pytesseract.image_to_string(image.convert("L"), timeout=OCR_CALL_TIMEOUT_SEC)
+    except PDFPopplerTimeoutError as e:
+        raise TimeoutError(f"PDF conversion timed out after {OCR_CALL_TIMEOUT_SEC:g}s") from e
+    except RuntimeError as e:
+        # pytesseract kills Tesseract and raises RuntimeError on timeout
+        if str(e) == "Tesseract process timeout":
+            raise TimeoutError(f"OCR timed out after {OCR_CALL_TIMEOUT_SEC:g}s") from e
+        print(f"Error extracting text: {e}")
+        return ""
     except Exception as e:
         print(f"Error extracting text: {e}")
         return ""
 
 
-def extract_structured_data_with_ai(raw_text, document_type="prescription"):
+# Structured output schemas (one per document type)
+class PrescriptionSchema(BaseModel):
+    doctor_name: Optional[str]
+    doctor_reg: Optional[str]
+    patient_name: Optional[str]
+    patient_age: Optional[int]
+    diagnosis: Optional[str]
+    medicines_prescribed: List[str]
+    tests_prescribed: List[str]
+    treatment_date: Optional[str]
+
+
+class BillItem(BaseModel):
+    name: str
+    amount: float
+
+
+class BillSchema(BaseModel):
+    hospital_name: Optional[str]
+    bill_number: Optional[str]
+    bill_date: Optional[str]
+    patient_name: Optional[str]
+    consultation_fee: Optional[float]
+    diagnostic_tests: Optional[float]
+    test_names: List[str]
+    medicines: Optional[float]
+    pharmacy_charges: Optional[float]
+    dental_charges: Optional[float]
+    total_amount: Optional[float]
+    items: List[BillItem]
+
+
+class TestReportSchema(BaseModel):
+    lab_name: Optional[str]
+    patient_name: Optional[str]
+    test_date: Optional[str]
+    tests_conducted: List[str]
+    doctor_referred_by: Optional[str]
+
+
+EXTRACTION_SCHEMAS = {
+    "prescription": PrescriptionSchema,
+    "bill": BillSchema,
+    "test_report": TestReportSchema,
+}
+
+EXTRACTION_PROMPTS = {
+    "prescription": "Extract the details of this medical prescription. "
+                    "doctor_reg is the doctor's registration number.",
+    "bill": "Extract the details of this medical bill, including every line item with its amount.",
+    "test_report": "Extract the details of this diagnostic test report.",
+}
+
+
+async def extract_structured_data_with_ai(raw_text, document_type="prescription"):
     """
     Use OpenAI to extract structured data from raw OCR text
     
@@ -53,81 +218,53 @@ def extract_structured_data_with_ai(raw_text, document_type="prescription"):
         document_type: Type of document (prescription, bill, test_report)
         
     Returns:
-        dict: Structured data extracted from document
+        dict: Structured data extracted from document (missing fields are None)
     """
+    if document_type not in EXTRACTION_SCHEMAS:
+        document_type = "prescription"
     
-    prompts = {
-        "prescription": """
-        Extract the following information from this medical prescription:
-        - doctor_name
-        - doctor_reg (registration number)
-        - patient_name
-        - patient_age
-        - diagnosis
-        - medicines_prescribed (list)
-        - tests_prescribed (list if any)
-        - treatment_date
-        
-        Return ONLY a valid JSON object with these fields. If a field is not found, use null.
-        """,
-        
-        "bill": """
-        Extract the following information from this medical bill:
-        - hospital_name
-        - bill_number
-        - bill_date
-        - patient_name
-        - consultation_fee (number)
-        - diagnostic_tests (number)
-        - test_names (list)
-        - medicines (number)
-        - pharmacy_charges (number)
-        - dental_charges (number)
-        - total_amount (number)
-        - items (list of {name, amount})
-        
-        Return ONLY a valid JSON object with these fields. If a field is not found, use null.
-        """,
-        
-        "test_report": """
-        Extract the following information from this diagnostic test report:
-        - lab_name
-        - patient_name
-        - test_date
-        - tests_conducted (list)
-        - doctor_referred_by
-        
-        Return ONLY a valid JSON object with these fields. If a field is not found, use null.
-        """
-    }
+    text_digest = hashlib.blake2b(raw_text.encode(), digest_size=16).hexdigest()
+    cache_key = (text_digest, document_type)
     
     try:
-        response = openai.chat.completions.create(
-            model="gpt-4",
-            messages=[
-                {"role": "system", "content": "You are a medical document data extraction expert. Extract information accurately and return valid JSON only."},
-                {"role": "user", "content": f"{prompts.get(document_type, prompts['prescription'])}\n\nDocument Text:\n{raw_text}"}
-            ],
-            temperature=0.1,
-            max_tokens=1000
-        )
-        
-        # Extract JSON from response
-        result = response.choices[0].message.content.strip()
-        
-        # Clean up response (remove markdown code blocks if present)
-        result = result.replace("```json", "").replace("```", "").strip()
+        parsed = _extraction_cache.get(cache_key)
+        if parsed is None:
+            response = await get_openai_client().responses.parse(
+                model=EXTRACTION_MODEL,
+                instructions="You are a medical document data extraction expert. Extract information accurately. "
+                             "If a field is not found, use null.",
+                input=f"{EXTRACTION_PROMPTS[document_type]}\n\nDocument Text:\n{raw_text}",
+                text_format=EXTRACTION_SCHEMAS[document_type],
+                temperature=0.1,
+            )
+            parsed = response.output_parsed
+            _extraction_cache[cache_key] = parsed
         
-        # Parse JSON
-        structured_data = json.loads(result)
-        return structured_data
+        # Fresh dict per call: callers annotate the extracted data in place
+        return parsed.model_dump()
         
     except Exception as e:
         print(f"Error in AI extraction: {e}")
         return {}
 
 
-def process_claim_documents(document_paths):
+async def extract_document(doc_type, file_path):
+    """
+    OCR a single document and extract its structured data
+    
+    OCR runs in the worker process pool; AI extraction starts as soon as this
+    document's text is ready, without waiting for the other documents.
+    
+    Returns:
+        tuple: (raw_text, structured_data)
+    """
+    loop = asyncio.get_running_loop()
+    raw_text = await loop.run_in_executor(OCR_POOL, extract_text_from_document, file_path)
+    structured_data = await extract_structured_data_with_ai(raw_text, doc_type)
+    return raw_text, structured_data
+
+
+async def process_claim_documents(document_paths):
     """
     Process all claim documents and extract structured information
     + Auto-extract dental/medical procedures from raw text
@@ -140,22 +277,20 @@ def process_claim_documents(document_paths):
         "raw_texts": {}
     }
 
-    for doc_type, file_path in document_paths.items():
-        if not file_path:
-            continue
-
+    documents = {doc_type: path for doc_type, path in document_paths.items() if path}
+    for doc_type, file_path in documents.items():
         print(f"Processing {doc_type}: {file_path}")
 
-        # -------------------------------------------------
-        # 1. RAW OCR TEXT
-        # -------------------------------------------------
-        raw_text = extract_text_from_document(file_path)
-        claim_data["raw_texts"][doc_type] = raw_text
+    # -------------------------------------------------
+    # 1. RAW OCR TEXT + 2. AI STRUCTURED EXTRACTION
+    #    (documents run concurrently, each pipelined independently)
+    # -------------------------------------------------
+    results = await asyncio.gather(*[
+        extract_document(doc_type, file_path) for doc_type, file_path in documents.items()
+    ])
 
-        # -------------------------------------------------
-        # 2. AI STRUCTURED EXTRACTION
-        # -------------------------------------------------
-        structured_data = extract_structured_data_with_ai(raw_text, doc_type)
+    for doc_type, (raw_text, structured_data) in zip(documents, results):
+        claim_data["raw_texts"][doc_type] = raw_text
 
         # -------------------------------------------------
         # 3. ASSIGN STRUCTURED OUTPUT
@@ -178,14 +313,10 @@ def process_claim_documents(document_paths):
                     procedures.append(cleaned)
 
             # Backup keyword-based extraction
-            if "root canal" in raw_lower:
-                procedures.append("Root Canal Treatment")
-            if "whitening" in raw_lower:
-                procedures.append("Teeth Whitening (Cosmetic)")
-            if "scaling" in raw_lower:
-                procedures.append("Scaling / Cleaning")
-            if "filling" in raw_lower:
-                procedures.append("Dental Filling")
+            keywords = find_procedure_keywords(raw_lower)
+            for keyword, procedure in PRESCRIPTION_PROCEDURES.items():
+                if keyword in keywords:
+                    procedures.append(procedure)
 
             # Deduplicate (preserve order)
             procedures = list(dict.fromkeys(procedures))
@@ -200,17 +331,13 @@ def process_claim_documents(document_paths):
             # AUTO-CHECK BILL ITEMS FOR DENTAL SIGNALS
             # ----------------------------------------------
             items = structured_data.get("items", [])
-            dental_terms = ["root canal", "whitening", "scaling", "filling"]
 
             for item in items:
-                if "root canal" in item["name"].lower():
-                    item.setdefault("category", "dental")
-                if "whiten" in item["name"].lower():
-                    item.setdefault("category", "cosmetic")
-                if "scaling" in item["name"].lower():
-                    item.setdefault("category", "dental")
-                if "filling" in item["name"].lower():
-                    item.setdefault("category", "dental")
+                keywords = find_procedure_keywords(item["name"].lower())
+                for keyword, category in BILL_ITEM_CATEGORIES.items():
+                    if keyword in keywords:
+                        item.setdefault("category", category)
+                        break
 
         elif doc_type == "test_report":
             claim_data["test_reports"].append(structured_data)
@@ -233,25 +360,7 @@ def validate_doctor_registration(reg_number):
     if not reg_number:
         return False
     
-    # Pattern 1: Standard medical - XX/XXXXX/XXXX (State/Number/Year)
-    pattern1 = r'^[A-Z]{2,4}/\d{4,6}/\d{4}$'
-
-    pattern2 = r'^(AYUR|HOMEO|UNANI)/[A-Z]{2,4}/\d{4,6}/\d{4}$'
-
-    return bool(re.match(pattern1, reg_number) or re.match(pattern2, reg_number))
-
-
-def check_document_completeness(claim_data):
-    missing = []
-    
-    if not claim_data.get("prescription"):
-        missing.append("prescription")
-    
-    if not claim_data.get("bill"):
-        missing.append("bill")
-
-    return len(missing) == 0, missing
-
+    return DOCTOR_REG_PATTERN.match(reg_number) is not None
 
 
 def check_document_completeness(claim_data):
@@ -264,36 +373,5 @@ def check_document_completeness(claim_data):
     Returns:
         tuple: (is_complete: bool, missing_docs: list)
     """
-    missing = []
-    
-    if not claim_data.get("prescription"):
-        missing.append("prescription")
-    
-    if not claim_data.get("bill"):
-        missing.append("bill")
-    
-    return len(missing) == 0, missing
-
-    
-    return bool(re.match(pattern1, reg_number) or re.match(pattern2, reg_number))
-
-
-def check_document_completeness(claim_data):
-    """
-    Check if all required documents are present
-    
-    Args:
-        claim_data: Structured claim data
-        
-    Returns:
-        tuple: (is_complete: bool, missing_docs: list)
-    """
-    missing = []
-    
-    if not claim_data.get("prescription"):
-        missing.append("prescription")
-    
-    if not claim_data.get("bill"):
-        missing.append("bill")
-    
-    return len(missing) == 0, missing
\ No newline at end of file
+    missing = [doc for doc in ("prescription", "bill") if not claim_data.get(doc)]
+    return not missing, missing
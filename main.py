@@ -2,20 +2,25 @@
 FastAPI Application with Supabase Integration
 3 Endpoints: Register Member, Upload Documents, Get Results
 """
-from fastapi import FastAPI, File, UploadFile, Form, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, File, UploadFile, Form, Header, HTTPException, BackgroundTasks, Query
+from fastapi.responses import ORJSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
-from datetime import datetime
+from datetime import date
+import asyncio
 import os
+import re
 import tempfile
-import shutil
-from supabase import create_client, Client
+import aiofiles
+import httpx
+from cachetools import LRUCache, TTLCache
+from supabase import acreate_client, AsyncClient, AsyncClientOptions
+from postgrest.exceptions import APIError
 from dotenv import load_dotenv
 
-from document_processor import process_claim_documents
-from adjudication_engine import ClaimAdjudicator
+from document_processor import process_claim_documents, configure_openai_client, start_ocr_pool, shutdown_ocr_pool
+from adjudication_engine import ClaimAdjudicator, new_claim_id
 
 # Load environment variables
 load_dotenv()
@@ -24,9 +29,77 @@ load_dotenv()
 app = FastAPI(
     title="OPD Claim Adjudication API with Supabase",
     description="3-step claim processing with persistent database storage",
-    version="2.0.0"
+    version="2.0.0",
+    default_response_class=ORJSONResponse
 )
 
+# Upload size limits: per document, and for the whole upload request
+# (three documents plus multipart overhead)
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(10 * 1024 * 1024)))
+MAX_UPLOAD_REQUEST_BYTES = 3 * MAX_UPLOAD_BYTES + 1024 * 1024
+
+class _UploadTooLarge(Exception):
+    """Raised from UploadSizeLimitMiddleware's receive once the body is over the limit"""
+
+class UploadSizeLimitMiddleware:
+    """
+    Reject oversize claim uploads before Starlette spools the body to disk
+    
+    A declared Content-Length over the limit is rejected up front; chunked
+    bodies are counted as they arrive and cut off with 413 once over it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != "/api/v1/claims/upload":
+            await self.app(scope, receive, send)
+            return
+
+        content_length = dict(scope["headers"]).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > MAX_UPLOAD_REQUEST_BYTES:
+            response = ORJSONResponse(status_code=413, content={"detail": "Upload too large"})
+            await response(scope, receive, send)
+            return
+
+        received = 0
+        too_large = False
+        response_started = False
+
+        async def limited_receive():
+            nonlocal received, too_large
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > MAX_UPLOAD_REQUEST_BYTES:
+                    too_large = True
+                    raise _UploadTooLarge()
+            return message
+
+        async def guarded_send(message):
+            # Once over the limit, whatever the app makes of the aborted body read
+            # (e.g. a 400 from form parsing) is dropped in favour of the 413 below
+            nonlocal response_started
+            if too_large:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not too_large:
+                raise
+        if too_large and not response_started:
+            response = ORJSONResponse(status_code=413, content={"detail": "Upload too large"})
+            await response(scope, receive, send)
+
+
+# Registered before CORS, so CORS stays the outer layer and adds its headers to the 413
+app.add_middleware(UploadSizeLimitMiddleware)
+
 # Add CORS
 app.add_middleware(
     CORSMiddleware,
@@ -43,30 +116,155 @@ SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 if not SUPABASE_URL or not SUPABASE_KEY:
     raise Exception("SUPABASE_URL and SUPABASE_KEY must be set in .env file")
 
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+# Timeout (seconds) for Supabase calls, set on the Supabase HTTP client itself
+# (supabase-py ignores its own timeout options when given an httpx client)
+SUPABASE_TIMEOUT = float(os.getenv("SUPABASE_TIMEOUT", "10"))
+
+# Async Supabase client, created on startup on its own connection pool
+supabase: Optional[AsyncClient] = None
+
+# Connection pool for OpenAI calls (created on startup, closed on shutdown)
+shared_http: Optional[httpx.AsyncClient] = None
+
+# Connection pool owned by the Supabase client. Kept separate from shared_http because
+# postgrest sets its base_url and default headers (service key) on the client it is given.
+supabase_http: Optional[httpx.AsyncClient] = None
 
 # Initialize adjudicator
 adjudicator = ClaimAdjudicator()
 
+# Postgres error codes
+UNIQUE_VIOLATION = "23505"
+NO_DATA_FOUND = "P0002"  # raised by create_pending_claim for unknown members
+
+# Upper bound (seconds) on OCR + AI extraction for one claim
+OCR_TIMEOUT_SEC = float(os.getenv("OCR_TIMEOUT_SEC", "30"))
+
+# Member columns needed to adjudicate a claim
+MEMBER_COLUMNS = "member_id, member_name, member_join_date, previous_claims_ytd, hospital, cashless_request"
+
+# Member IDs known to exist, so repeat registrations are rejected without a DB call.
+# A miss is not authoritative: the insert below still enforces uniqueness.
+KNOWN_MEMBER_IDS: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+
+# Completed claim results never change, so they are cached until evicted: claim_id -> (result, etag)
+CLAIM_RESULT_CACHE: LRUCache = LRUCache(maxsize=10_000)
+# Responses hold medical data: only the client's own cache may keep them, for a bounded time
+CLAIM_RESULT_CACHE_CONTROL = "private, max-age=3600"
+
+# Member stats change only when a claim completes: member_id -> (stats, etag).
+# Dropped when one of the member's claims is finalized in this process.
+MEMBER_STATS_CACHE: TTLCache = TTLCache(maxsize=10_000, ttl=60)
+MEMBER_STATS_CACHE_CONTROL = "private, max-age=60"
+
 # Pydantic models
 class MemberRegistration(BaseModel):
     member_id: str
     member_name: str
-    member_join_date: str  # YYYY-MM-DD
+    member_join_date: date  # YYYY-MM-DD
     hospital: Optional[str] = None
     previous_claims_ytd: float = 0
     cashless_request: bool = False
 
-# Helper function
-def save_upload_file(upload_file: UploadFile) -> str:
-    """Save uploaded file to temporary location"""
+@app.on_event("startup")
+async def create_shared_http_client():
+    """Open the HTTP/2 connection pool for OpenAI calls"""
+    global shared_http
+    shared_http = httpx.AsyncClient(
+        http2=True,
+        timeout=30,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+    configure_openai_client(shared_http)
+
+@app.on_event("startup")
+async def create_supabase_client():
+    """
+    Create the async Supabase client on its own HTTP/2 connection pool
+    
+    All database access goes through PostgREST over this pool, so requests
+    multiplex over a few kept-alive connections and Supabase's own pooler
+    holds the Postgres connections.
+    """
+    global supabase, supabase_http
+    supabase_http = httpx.AsyncClient(
+        http2=True,
+        timeout=SUPABASE_TIMEOUT,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+    supabase = await acreate_client(
+        SUPABASE_URL, SUPABASE_KEY,
+        options=AsyncClientOptions(httpx_client=supabase_http)
+    )
+
+@app.on_event("shutdown")
+async def close_shared_http_client():
+    """Close the OpenAI and Supabase HTTP connection pools"""
+    for client in (shared_http, supabase_http):
+        if client is not None:
+            await client.aclose()
+
+@app.on_event("startup")
+async def start_ocr_workers():
+    """Start the OCR worker process pool"""
+    start_ocr_pool()
+
+@app.on_event("shutdown")
+async def stop_ocr_workers():
+    """Stop the OCR worker process pool (off the event loop: it waits for running jobs)"""
+    await asyncio.to_thread(shutdown_ocr_pool)
+
+@app.on_event("startup")
+async def load_known_member_ids():
+    """Hydrate the known member ID cache with a single query"""
+    try:
+        rows = await supabase.table("members").select("member_id").execute()
+        for row in rows.data:
+            KNOWN_MEMBER_IDS[row["member_id"]] = True
+    except Exception as e:
+        print(f"Could not preload member IDs: {e}")
+
+# Helper functions
+def cached_json_response(content: dict, etag: str, cache_control: str, if_none_match: Optional[str]):
+    """JSON response with caching headers, or 304 if the client already has this ETag"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if if_none_match == etag:
+        return Response(status_code=304, headers=headers)
+    return ORJSONResponse(content=content, headers=headers)
+
+# Chunk size for streaming uploads to disk
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+async def save_upload_file(upload_file: UploadFile) -> tuple:
+    """
+    Save uploaded file to temporary location without blocking the event loop
+    
+    Stops with 413 as soon as the file exceeds MAX_UPLOAD_BYTES.
+    
+    Returns:
+        tuple: (path, size in bytes)
+    """
     try:
         suffix = os.path.splitext(upload_file.filename)[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            shutil.copyfileobj(upload_file.file, tmp)
-            return tmp.name
+        fd, path = tempfile.mkstemp(suffix=suffix)
+        size = 0
+        try:
+            # Write through mkstemp's descriptor (closed with the file) rather than reopening the path
+            async with aiofiles.open(fd, "wb") as tmp:
+                while chunk := await upload_file.read(UPLOAD_CHUNK_SIZE):
+                    size += len(chunk)
+                    if size > MAX_UPLOAD_BYTES:
+                        raise HTTPException(
+                            status_code=413,
+                            detail=f"'{upload_file.filename}' exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)}MB upload limit"
+                        )
+                    await tmp.write(chunk)
+        except BaseException:
+            await asyncio.to_thread(os.unlink, path)
+            raise
+        return path, size
     finally:
-        upload_file.file.close()
+        await upload_file.close()
 
 # ============================================================================
 # ENDPOINT 1: REGISTER MEMBER (Store in Supabase)
@@ -87,38 +285,38 @@ async def register_member(member: MemberRegistration):
     }
     """
     try:
-        # Check if member already exists
-        existing = supabase.table("members").select("*").eq("member_id", member.member_id).execute()
-        if existing.data:
+        if member.member_id in KNOWN_MEMBER_IDS:
             raise HTTPException(status_code=400, detail=f"Member ID '{member.member_id}' already exists")
         
-        # Insert member into database
         member_data = {
             "member_id": member.member_id,
             "member_name": member.member_name,
-            "member_join_date": member.member_join_date,
+            "member_join_date": member.member_join_date.isoformat(),
             "hospital": member.hospital,
             "previous_claims_ytd": member.previous_claims_ytd,
             "cashless_request": member.cashless_request
         }
         
-        response = supabase.table("members").insert(member_data).execute()
-        
-        # Log audit
-        audit_data = {
-            "action_type": "member_registered",
-            "member_id": member.member_id,
-            "action_data": member_data
-        }
-        supabase.table("audit_log").insert(audit_data).execute()
-        
-        return JSONResponse(content={
+        # Insert member and audit log entry in one round-trip/transaction
+        # (sql/002_register_member_and_audit.sql). members.member_id is UNIQUE
+        # (sql/001_members_member_id_unique.sql), so the insert doubles as the
+        # existence check and a duplicate comes back as a unique violation.
+        try:
+            response = await supabase.rpc("register_member_and_audit", {"p": member_data}).execute()
+        except APIError as e:
+            if e.code == UNIQUE_VIOLATION:
+                KNOWN_MEMBER_IDS[member.member_id] = True
+                raise HTTPException(status_code=400, detail=f"Member ID '{member.member_id}' already exists")
+            raise
+        KNOWN_MEMBER_IDS[member.member_id] = True
+        
+        return {
             "status": "success",
             "message": "Member registered successfully in database",
             "member_id": member.member_id,
             "member_name": member.member_name,
             "registered_at": response.data[0]["registered_at"]
-        })
+        }
         
     except HTTPException:
         raise
@@ -128,85 +326,34 @@ async def register_member(member: MemberRegistration):
 # ============================================================================
 # ENDPOINT 2: UPLOAD DOCUMENTS (Process and Store in Supabase)
 # ============================================================================
-@app.post("/api/v1/claims/upload")
-async def upload_documents(
-    member_id: str = Form(...),
-    treatment_date: str = Form(...),  # YYYY-MM-DD
-    prescription: UploadFile = File(...),
-    bill: UploadFile = File(...),
-    test_report: Optional[UploadFile] = File(None)
-):
+async def _fail_claim(claim_id: str, status: str, reason: str):
+    """Mark a pending claim as failed (sql/005_pending_claims.sql)"""
+    try:
+        await supabase.rpc("fail_claim", {
+            "p_claim_id": claim_id,
+            "p_status": status,
+            "p_reason": reason
+        }).execute()
+    except Exception as db_error:
+        print(f"Could not mark claim {claim_id} as {status}: {db_error}")
+
+async def _process_and_finalize(claim_id: str, member_info: dict, treatment_date: date,
+                                document_paths: dict, temp_files: list):
     """
-    Step 2: Upload documents for a registered member
-    
-    Form Data:
-    - member_id: EMP010
-    - treatment_date: 2024-11-03
-    - prescription: (file upload)
-    - bill: (file upload)
-    - test_report: (optional file upload)
+    Background half of upload_documents: OCR + AI extraction, adjudication and
+    storing the decision on the pending claim. Cleans up the uploaded files.
     """
-    temp_files = []
-    
+    member_id = member_info["member_id"]
     try:
-        # Check if member exists in database
-        member_response = supabase.table("members").select("*").eq("member_id", member_id).execute()
-        if not member_response.data:
-            raise HTTPException(
-                status_code=404, 
-                detail=f"Member ID '{member_id}' not found. Please register member first."
-            )
-        
-        member_info = member_response.data[0]
-        
-        # Log document uploads
-        doc_upload_records = []
-        
-        # Save uploaded files
-        prescription_path = save_upload_file(prescription)
-        bill_path = save_upload_file(bill)
-        temp_files.extend([prescription_path, bill_path])
-        
-        doc_upload_records.append({
-            "document_type": "prescription",
-            "original_filename": prescription.filename,
-            "file_size_bytes": os.path.getsize(prescription_path),
-            "upload_status": "processing"
-        })
-        
-        doc_upload_records.append({
-            "document_type": "bill",
-            "original_filename": bill.filename,
-            "file_size_bytes": os.path.getsize(bill_path),
-            "upload_status": "processing"
-        })
-        
-        document_paths = {
-            "prescription": prescription_path,
-            "bill": bill_path
-        }
-        
-        if test_report:
-            test_report_path = save_upload_file(test_report)
-            document_paths["test_report"] = test_report_path
-            temp_files.append(test_report_path)
-            
-            doc_upload_records.append({
-                "document_type": "test_report",
-                "original_filename": test_report.filename,
-                "file_size_bytes": os.path.getsize(test_report_path),
-                "upload_status": "processing"
-            })
-        
         # Process documents using OCR and AI
         print(f"Processing documents for member: {member_id}")
-        claim_data = process_claim_documents(document_paths)
+        claim_data = await asyncio.wait_for(process_claim_documents(document_paths), OCR_TIMEOUT_SEC)
         
         # Prepare member info for adjudication
         member_adj_info = {
-            "member_id": member_info["member_id"],
+            "member_id": member_id,
             "member_name": member_info["member_name"],
-            "member_join_date": member_info["member_join_date"],
+            "member_join_date": date.fromisoformat(member_info["member_join_date"]),
             "treatment_date": treatment_date,
             "previous_claims_ytd": member_info["previous_claims_ytd"],
             "previous_claims_same_day": 0,  # Can be calculated from recent claims
@@ -221,26 +368,21 @@ async def upload_documents(
         
         # Run adjudication
         print(f"Running adjudication for claim amount: {claim_amount}")
-        decision = adjudicator.adjudicate_claim(claim_data, member_adj_info)
-        
-        claim_id = decision["claim_id"]
+        decision = adjudicator.adjudicate_claim(claim_data, member_adj_info, claim_id=claim_id)
         
         # ===== STORE IN DATABASE =====
         
-        # 1. Insert claim record
+        # 1. Claim record
         claim_record = {
             "claim_id": claim_id,
-            "member_id": member_id,
-            "treatment_date": treatment_date,
             "claim_amount": claim_amount,
             "decision": decision["decision"],
             "approved_amount": decision["approved_amount"],
             "confidence_score": decision["confidence_score"],
             "notes": decision["notes"]
         }
-        supabase.table("claims").insert(claim_record).execute()
         
-        # 2. Insert claim details
+        # 2. Claim details
         claim_details_record = {
             "claim_id": claim_id,
             "rejection_reasons": decision["rejection_reasons"],
@@ -253,18 +395,8 @@ async def upload_documents(
             "test_report_data": claim_data.get("test_reports", []),
             "raw_ocr_text": claim_data.get("raw_texts", {})
         }
-        supabase.table("claim_details").insert(claim_details_record).execute()
-        
-        # 3. Insert document upload records
-        for doc_record in doc_upload_records:
-            doc_record["claim_id"] = claim_id
-            doc_record["upload_status"] = "completed"
-            doc_record["ocr_status"] = "completed"
-            doc_record["processed_at"] = datetime.now().isoformat()
         
-        supabase.table("document_uploads").insert(doc_upload_records).execute()
-        
-        # 4. Log audit
+        # 3. Audit entry
         audit_data = {
             "action_type": "claim_processed",
             "member_id": member_id,
@@ -275,17 +407,131 @@ async def upload_documents(
                 "approved_amount": decision["approved_amount"]
             }
         }
-        supabase.table("audit_log").insert(audit_data).execute()
         
-        return JSONResponse(content={
-            "status": "success",
-            "message": "Documents uploaded and claim processed successfully",
+        # Update the claim, add its details/audit entry and complete its document
+        # uploads in one round-trip/transaction (sql/005_pending_claims.sql)
+        await supabase.rpc("finalize_claim", {
+            "claim": claim_record,
+            "details": claim_details_record,
+            "audit": audit_data
+        }).execute()
+        MEMBER_STATS_CACHE.pop(member_id, None)
+        
+    except (asyncio.TimeoutError, TimeoutError) as e:
+        # Either the OCR_TIMEOUT_SEC budget for the claim or a single OCR call ran out
+        print(f"Document processing timed out for claim {claim_id}")
+        await _fail_claim(claim_id, "failed_timeout", str(e) or f"Document processing timed out after {OCR_TIMEOUT_SEC:g}s")
+    
+    except Exception as e:
+        print(f"Error processing claim {claim_id}: {e}")
+        await _fail_claim(claim_id, "failed", f"Error processing claim: {str(e)}")
+    
+    finally:
+        # Clean up temp files
+        await asyncio.gather(
+            *[asyncio.to_thread(os.unlink, temp_file) for temp_file in temp_files],
+            return_exceptions=True
+        )
+
+@app.post("/api/v1/claims/upload", status_code=202)
+async def upload_documents(
+    background_tasks: BackgroundTasks,
+    member_id: str = Form(...),
+    treatment_date: date = Form(...),  # YYYY-MM-DD
+    prescription: UploadFile = File(...),
+    bill: UploadFile = File(...),
+    test_report: Optional[UploadFile] = File(None)
+):
+    """
+    Step 2: Upload documents for a registered member
+    
+    Form Data:
+    - member_id: EMP010
+    - treatment_date: 2024-11-03
+    - prescription: (file upload)
+    - bill: (file upload)
+    - test_report: (optional file upload)
+    
+    Returns 202 with the claim_id once the documents are stored; OCR and
+    adjudication run in the background. Poll GET /api/v1/claims/{claim_id}/result.
+    """
+    temp_files = []
+    member_not_found = HTTPException(
+        status_code=404, 
+        detail=f"Member ID '{member_id}' not found. Please register member first."
+    )
+    
+    # Look the member up while the uploads are written to disk
+    member_lookup = asyncio.create_task(
+        supabase.table("members").select(MEMBER_COLUMNS).eq("member_id", member_id).execute()
+    )
+    
+    try:
+        uploads = [("prescription", prescription), ("bill", bill)]
+        if test_report:
+            uploads.append(("test_report", test_report))
+        
+        # Save uploaded files concurrently
+        saved = await asyncio.gather(
+            *[save_upload_file(upload_file) for _, upload_file in uploads],
+            return_exceptions=True
+        )
+        temp_files.extend(result[0] for result in saved if not isinstance(result, BaseException))
+        for result in saved:
+            if isinstance(result, BaseException):
+                raise result
+        
+        # Log document uploads
+        doc_upload_records = [
+            {
+                "document_type": doc_type,
+                "original_filename": upload_file.filename,
+                "file_size_bytes": size
+            }
+            for (doc_type, upload_file), (_, size) in zip(uploads, saved)
+        ]
+        
+        document_paths = {doc_type: path for (doc_type, _), (path, _) in zip(uploads, saved)}
+        
+        # Check if member exists in database
+        member_response = await member_lookup
+        if not member_response.data:
+            raise member_not_found
+        
+        member_info = member_response.data[0]
+        
+        claim_id = new_claim_id()
+        
+        # Pending claim and its document uploads in one round-trip/transaction
+        # (sql/005_pending_claims.sql). The function re-checks the member and
+        # raises P0002 if it no longer exists.
+        try:
+            await supabase.rpc("create_pending_claim", {
+                "claim": {
+                    "claim_id": claim_id,
+                    "member_id": member_id,
+                    "treatment_date": treatment_date.isoformat()
+                },
+                "docs": doc_upload_records
+            }).execute()
+        except APIError as e:
+            if e.code == NO_DATA_FOUND:
+                raise member_not_found
+            raise
+        
+        # The background task now owns the uploaded files
+        background_tasks.add_task(
+            _process_and_finalize, claim_id, member_info, treatment_date, document_paths, temp_files
+        )
+        temp_files = []
+        
+        return {
+            "status": "processing",
+            "message": "Documents uploaded; claim is being processed",
             "claim_id": claim_id,
             "member_id": member_id,
-            "member_name": member_info["member_name"],
-            "decision": decision["decision"],
-            "approved_amount": decision["approved_amount"]
-        })
+            "member_name": member_info["member_name"]
+        }
         
     except HTTPException:
         raise
@@ -293,38 +539,58 @@ async def upload_documents(
         raise HTTPException(status_code=500, detail=f"Error processing claim: {str(e)}")
     
     finally:
-        # Clean up temp files
-        for temp_file in temp_files:
-            try:
-                os.unlink(temp_file)
-            except:
-                pass
+        # Cancel the lookup if still running, and retrieve its outcome either way so a
+        # lookup that failed while a save did is not logged as never retrieved
+        member_lookup.cancel()
+        await asyncio.gather(member_lookup, return_exceptions=True)
+        
+        # Clean up temp files not handed to the background task
+        await asyncio.gather(
+            *[asyncio.to_thread(os.unlink, temp_file) for temp_file in temp_files],
+            return_exceptions=True
+        )
 
 # ============================================================================
 # ENDPOINT 3: GET CLAIM RESULT (From Supabase)
 # ============================================================================
 @app.get("/api/v1/claims/{claim_id}/result")
-async def get_claim_result(claim_id: str):
+async def get_claim_result(claim_id: str, if_none_match: Optional[str] = Header(None)):
     """
     Step 3: Get the adjudication result for a claim from database
     
     Returns complete decision with approval/rejection details
     """
+    cached = CLAIM_RESULT_CACHE.get(claim_id)
+    if cached:
+        return cached_json_response(*cached, CLAIM_RESULT_CACHE_CONTROL, if_none_match)
+    
     try:
-        # Fetch from view (joins claims + members + claim_details)
-        response = supabase.table("v_claims_complete").select("*").eq("claim_id", claim_id).execute()
-        
-        if not response.data:
-            raise HTTPException(
-                status_code=404,
-                detail=f"Claim ID '{claim_id}' not found in database"
-            )
-        
-        claim = response.data[0]
+        # Fetch from claims_complete (claims + members + claim_details, joined when the
+        # claim was finalized; sql/007_claims_complete_table.sql)
+        response = await supabase.table("claims_complete").select("*").eq("claim_id", claim_id).execute()
+        
+        claim = response.data[0] if response.data else None
+        status = claim.get("status", "completed") if claim else None
+        if claim is None:
+            # Claims still being processed have no claim_details row yet
+            status_response = await supabase.table("claims").select("status").eq("claim_id", claim_id).execute()
+            if not status_response.data:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"Claim ID '{claim_id}' not found in database"
+                )
+            status = status_response.data[0]["status"]
+        
+        if status != "completed":
+            return ORJSONResponse(status_code=202 if status == "processing" else 200, content={
+                "claim_id": claim_id,
+                "status": status
+            }, headers={"Cache-Control": "no-store"})
         
         # Format response
         result = {
             "claim_id": claim["claim_id"],
+            "status": status,
             "member_id": claim["member_id"],
             "member_name": claim["member_name"],
             "hospital": claim["hospital"],
@@ -354,7 +620,9 @@ async def get_claim_result(claim_id: str):
             }
         }
         
-        return JSONResponse(content=result)
+        etag = f'"{claim_id}:{claim["processed_at"]}"'
+        CLAIM_RESULT_CACHE[claim_id] = (result, etag)
+        return cached_json_response(result, etag, CLAIM_RESULT_CACHE_CONTROL, if_none_match)
         
     except HTTPException:
         raise
@@ -383,17 +651,21 @@ async def root():
     }
 
 @app.get("/api/v1/members/{member_id}/stats")
-async def get_member_stats(member_id: str):
+async def get_member_stats(member_id: str, if_none_match: Optional[str] = Header(None)):
     """Get statistics for a specific member"""
+    cached = MEMBER_STATS_CACHE.get(member_id)
+    if cached:
+        return cached_json_response(*cached, MEMBER_STATS_CACHE_CONTROL, if_none_match)
+    
     try:
-        response = supabase.table("v_member_stats").select("*").eq("member_id", member_id).execute()
+        response = await supabase.table("v_member_stats").select("*").eq("member_id", member_id).execute()
         
         if not response.data:
             raise HTTPException(status_code=404, detail=f"Member '{member_id}' not found")
         
         stats = response.data[0]
         
-        return JSONResponse(content={
+        result = {
             "member_id": stats["member_id"],
             "member_name": stats["member_name"],
             "member_join_date": stats["member_join_date"],
@@ -406,31 +678,77 @@ async def get_member_stats(member_id: str):
                 "total_approved": float(stats["total_approved"]) if stats["total_approved"] else 0,
                 "last_claim_date": stats["last_claim_date"]
             }
-        })
+        }
+        
+        etag = f'"{member_id}:{stats["total_claims"]}:{stats["last_claim_date"]}"'
+        MEMBER_STATS_CACHE[member_id] = (result, etag)
+        return cached_json_response(result, etag, MEMBER_STATS_CACHE_CONTROL, if_none_match)
         
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+# Cursor parts are interpolated into a PostgREST filter, so both must match exactly
+CURSOR_TIMESTAMP_PATTERN = re.compile(
+    r"\d{4}-\d{2}-\d{2}[T ]\d{2}:\d{2}:\d{2}(?:\.\d{1,6})?(?:Z|[+-]\d{2}(?::?\d{2})?)?"
+)
+CLAIM_ID_PATTERN = re.compile(r"CLM_\d+")
+
+def parse_claims_cursor(cursor: str) -> tuple:
+    """Split a "processed_at|claim_id" cursor, rejecting anything malformed with 400"""
+    processed_at, _, claim_id = cursor.rpartition("|")
+    if not (CURSOR_TIMESTAMP_PATTERN.fullmatch(processed_at) and CLAIM_ID_PATTERN.fullmatch(claim_id)):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return processed_at, claim_id
+
 @app.get("/api/v1/claims/all")
-async def get_all_claims(limit: int = 50, offset: int = 0, decision: Optional[str] = None):
-    """Get all claims with optional filtering"""
+async def get_all_claims(
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    decision: Optional[str] = None
+):
+    """
+    Get all claims with optional filtering, newest first
+    
+    Keyset-paginated on (processed_at, claim_id): pass the returned next_cursor
+    as cursor to fetch the next page.
+    """
     try:
-        query = supabase.table("v_claims_complete").select("*")
+        query = supabase.table("claims_complete").select("*")
         
         if decision:
             query = query.eq("decision", decision.upper())
         
-        response = query.order("processed_at", desc=True).range(offset, offset + limit - 1).execute()
+        if cursor:
+            processed_at, claim_id = parse_claims_cursor(cursor)
+            query = query.or_(
+                f'processed_at.lt."{processed_at}",'
+                f'and(processed_at.eq."{processed_at}",claim_id.lt."{claim_id}")'
+            )
         
-        return JSONResponse(content={
+        response = await (
+            query.order("processed_at", desc=True)
+            .order("claim_id", desc=True)
+            .limit(limit)
+            .execute()
+        )
+        
+        next_cursor = None
+        if len(response.data) == limit:
+            last = response.data[-1]
+            next_cursor = f"{last['processed_at']}|{last['claim_id']}"
+        
+        # Returned as a response object so the (large) page skips jsonable_encoder
+        return ORJSONResponse(content={
             "total": len(response.data),
             "limit": limit,
-            "offset": offset,
+            "next_cursor": next_cursor,
             "claims": response.data
         })
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
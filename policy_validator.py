@@ -2,16 +2,170 @@
 Policy Validation Module - FIXED VERSION v2
 Validates claims against policy terms and coverage rules
 """
+import itertools
 import json
-from datetime import datetime, timedelta
+import os
+import re
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 
 
+# Keyword tables are immutable ((label, keywords), ...) tuples: they are compiled into
+# the regexes below at import time, so they must not change afterwards
+
+# Exclusions that make the ENTIRE claim non-covered
+PRIMARY_EXCLUSIONS = (
+    ("weight loss", ("obesity", "weight loss", "bariatric")),
+    ("infertility", ("infertility", "ivf", "fertility treatment")),
+    ("experimental", ("experimental", "investigational")),
+)
+
+# Exclusions that can be excluded while rest of claim is covered
+SECONDARY_EXCLUSIONS = (
+    ("cosmetic", ("cosmetic", "aesthetic", "beautification", "whitening")),
+    ("supplements", ("diet plan", "weight management program")),
+)
+
+# Claim category keywords, in priority order
+CATEGORY_KEYWORDS = (
+    ("dental", ("tooth", "dental", "root canal", "filling", "extraction", "decay")),
+    ("vision", ("eye", "vision", "glasses", "contact lens", "lasik")),
+    ("alternative_medicine", ("ayurved", "homeopath", "unani", "panchakarma", "chronic joint")),
+    ("diagnostic_tests", ("mri", "ct scan", "ultrasound", "x-ray")),
+)
+
+# Tests/treatments requiring pre-authorization
+PREAUTH_KEYWORDS = ("mri", "ct scan")
+
+
+class KeywordGroups:
+    """((label, keywords), ...) table compiled into one case-insensitive regex, one named group per label"""
+    
+    def __init__(self, groups):
+        self.labels = tuple(label for label, _ in groups)
+        # Group gN holds the keywords of the Nth label, so a match's group gives its rank
+        self.group_ranks = {f"g{rank}": rank for rank in range(len(self.labels))}
+        alternation = "|".join(
+            f"(?P<g{rank}>{'|'.join(map(re.escape, keywords))})"
+            for rank, (_, keywords) in enumerate(groups)
+        )
+        # The alternation sits in a lookahead so every position is tried and keywords
+        # of different labels can't hide each other (same result as substring checks)
+        self.pattern = re.compile(f"(?=(?:{alternation}))", re.IGNORECASE)
+    
+    def search(self, text):
+        """Check if any keyword occurs in text"""
+        return self.pattern.search(text) is not None
+    
+    def find_labels(self, text):
+        """Return the labels with a keyword in text, in table order"""
+        ranks = {self.group_ranks[match.lastgroup] for match in self.pattern.finditer(text)}
+        return [self.labels[rank] for rank in sorted(ranks)]
+    
+    def first_label(self, *texts):
+        """
+        Return the first label (in table order) with a keyword in any of the texts, or None
+        
+        Stops scanning as soon as a keyword of the first label is seen.
+        """
+        best = None
+        for text in texts:
+            for match in self.pattern.finditer(text):
+                rank = self.group_ranks[match.lastgroup]
+                if rank == 0:
+                    return self.labels[0]
+                if best is None or rank < best:
+                    best = rank
+        return None if best is None else self.labels[best]
+
+
+PRIMARY_EXCLUSION_GROUPS = KeywordGroups(PRIMARY_EXCLUSIONS)
+SECONDARY_EXCLUSION_GROUPS = KeywordGroups(SECONDARY_EXCLUSIONS)
+CATEGORY_GROUPS = KeywordGroups(CATEGORY_KEYWORDS)
+# Whole words only (plural allowed), with any spacing between words: "MRI", "CT scan",
+# "CTscans" match; "Smriti" (contains "mri") does not
+PREAUTH_PATTERN = re.compile(
+    r"\b(?:%s)s?\b" % "|".join(r"\s*".join(map(re.escape, keyword.split())) for keyword in PREAUTH_KEYWORDS),
+    re.IGNORECASE
+)
+
+
+@dataclass(frozen=True)
+class NormalizedClaim:
+    """
+    Claim text fields normalised once per claim and shared by all policy checks
+    (frozen and tuple-valued, so it can be used as a cache key)
+    """
+    diagnosis: str = ""
+    treatments: tuple = ()
+    medicines: tuple = ()
+    tests: tuple = ()
+    diagnosis_lower: str = field(init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        object.__setattr__(self, "diagnosis_lower", self.diagnosis.lower())
+    
+    @classmethod
+    def from_documents(cls, prescription, bill):
+        """Build from extracted prescription/bill data (missing fields become empty)"""
+        treatments = prescription.get("procedures") or prescription.get("treatment") or ()
+        if isinstance(treatments, str):
+            treatments = (treatments,)
+        return cls(
+            diagnosis=prescription.get("diagnosis") or "",
+            treatments=tuple(treatments),
+            medicines=tuple(prescription.get("medicines_prescribed") or ()),
+            tests=tuple(prescription.get("tests_prescribed") or bill.get("test_names") or ())
+        )
+
+
+@dataclass(frozen=True)
+class PolicyTerms:
+    """Policy JSON plus the date/duration fields pre-parsed for per-claim checks"""
+    policy: dict
+    effective_date: date
+    initial_waiting: timedelta
+    specific_ailments: tuple  # ((ailment, ailment_lower, waiting timedelta), ...)
+
+
+@lru_cache(maxsize=1)
+def load_policy_terms(policy_path, mtime_ns):
+    """
+    Load and pre-parse policy terms (cached; mtime_ns in the key picks up file edits)
+    """
+    with open(policy_path, 'r') as f:
+        policy = json.load(f)
+    
+    waiting_periods = policy["waiting_periods"]
+    return PolicyTerms(
+        policy=policy,
+        effective_date=datetime.strptime(policy["effective_date"], "%Y-%m-%d").date(),
+        initial_waiting=timedelta(days=waiting_periods["initial_waiting"]),
+        specific_ailments=tuple(
+            (ailment, ailment.lower(), timedelta(days=days))
+            for ailment, days in waiting_periods["specific_ailments"].items()
+        )
+    )
+
+
 class PolicyValidator:
     def __init__(self, policy_path="policy_terms.json"):
         """Initialize with policy terms"""
-        with open(policy_path, 'r') as f:
-            self.policy = json.load(f)
+        self.terms = load_policy_terms(policy_path, os.stat(policy_path).st_mtime_ns)
+        self.policy = self.terms.policy
+        
+        # Limits used by check_limits on every claim
+        coverage = self.policy["coverage_details"]
+        self._min_claim = self.policy["claim_requirements"]["minimum_claim_amount"]
+        self._per_claim_limit = coverage["per_claim_limit"]
+        self._annual_limit = coverage["annual_limit"]
+        # Specialized categories with their own sub-limits (checked instead of the per-claim limit)
+        self._category_sub_limits = {
+            category: coverage[category]["sub_limit"]
+            for category in ("diagnostic_tests", "pharmacy", "dental", "vision", "alternative_medicine")
+        }
     
     def check_member_eligibility(self, member_id, treatment_date):
         """
@@ -19,7 +173,7 @@ class PolicyValidator:
         
         Args:
             member_id: Member ID
-            treatment_date: Date of treatment (string or datetime)
+            treatment_date: Date of treatment (date)
             
         Returns:
             dict: {eligible: bool, reason: str}
@@ -30,39 +184,27 @@ class PolicyValidator:
             return {"eligible": False, "reason": "MEMBER_NOT_FOUND"}
         
         # Check policy status
-        policy_start = datetime.strptime(self.policy["effective_date"], "%Y-%m-%d")
-        if isinstance(treatment_date, str):
-            treatment_date = datetime.strptime(treatment_date, "%Y-%m-%d")
-        
-        if treatment_date < policy_start:
+        if treatment_date < self.terms.effective_date:
             return {"eligible": False, "reason": "POLICY_INACTIVE"}
         
         return {"eligible": True, "reason": None}
     
-    def check_waiting_period(self, member_join_date, treatment_date, diagnosis):
+    def check_waiting_period(self, member_join_date, treatment_date, diagnosis_lower):
         """
         Check if waiting period is satisfied for the condition
         
         Args:
-            member_join_date: When member joined policy
-            treatment_date: Date of treatment
-            diagnosis: Medical diagnosis
+            member_join_date: When member joined policy (date)
+            treatment_date: Date of treatment (date)
+            diagnosis_lower: Medical diagnosis, lowercased (NormalizedClaim.diagnosis_lower)
             
         Returns:
             dict: {satisfied: bool, reason: str, eligible_date: str}
         """
-        if isinstance(member_join_date, str):
-            member_join_date = datetime.strptime(member_join_date, "%Y-%m-%d")
-        if isinstance(treatment_date, str):
-            treatment_date = datetime.strptime(treatment_date, "%Y-%m-%d")
-        
-        waiting_periods = self.policy["waiting_periods"]
-        diagnosis_lower = diagnosis.lower() if diagnosis else ""
-        
         # Check for specific ailments
-        for ailment, days in waiting_periods["specific_ailments"].items():
-            if ailment.lower() in diagnosis_lower:
-                eligible_date = member_join_date + timedelta(days=days)
+        for ailment, ailment_lower, waiting in self.terms.specific_ailments:
+            if ailment_lower in diagnosis_lower:
+                eligible_date = member_join_date + waiting
                 if treatment_date < eligible_date:
                     return {
                         "satisfied": False,
@@ -72,7 +214,7 @@ class PolicyValidator:
                     }
         
         # Check initial waiting period
-        initial_eligible = member_join_date + timedelta(days=waiting_periods["initial_waiting"])
+        initial_eligible = member_join_date + self.terms.initial_waiting
         if treatment_date < initial_eligible:
             return {
                 "satisfied": False,
@@ -83,43 +225,19 @@ class PolicyValidator:
         
         return {"satisfied": True, "reason": None}
     
-    def check_coverage(self, diagnosis, treatments, medicines):
+    def check_coverage(self, claim):
         """
         Check if diagnosis and treatments are covered
         
         Args:
-            diagnosis: Medical diagnosis
-            treatments: List of treatments/procedures
-            medicines: List of medicines
+            claim: NormalizedClaim (diagnosis, treatments/procedures, medicines)
             
         Returns:
             dict: {covered: bool, excluded_items: list, category: str, partial_coverage: bool}
         """
-        diagnosis_lower = diagnosis.lower() if diagnosis else ""
-        excluded_items = []
-        
-        # Define exclusion keywords with PRIMARY vs SECONDARY classification
-        primary_exclusions = {
-            # These make the ENTIRE claim non-covered
-            "weight loss": ["obesity", "weight loss", "bariatric"],
-            "infertility": ["infertility", "ivf", "fertility treatment"],
-            "experimental": ["experimental", "investigational"],
-        }
-        
-        secondary_exclusions = {
-            # These can be excluded while rest of claim is covered
-            "cosmetic": ["cosmetic", "aesthetic", "beautification", "whitening"],
-            "supplements": ["diet plan", "weight management program"],
-        }
-        
         # Check if PRIMARY diagnosis/treatment is excluded
-        primary_excluded = False
-        for exclusion_type, keywords in primary_exclusions.items():
-            for keyword in keywords:
-                if keyword in diagnosis_lower:
-                    excluded_items.append(exclusion_type)
-                    primary_excluded = True
-                    break
+        excluded_items = PRIMARY_EXCLUSION_GROUPS.find_labels(claim.diagnosis)
+        primary_excluded = bool(excluded_items)
         
         # If primary diagnosis is excluded, entire claim is not covered
         if primary_excluded:
@@ -132,26 +250,16 @@ class PolicyValidator:
         
         # Check treatments for both primary and secondary exclusions
         partial_exclusions = []
-        if treatments:
-            for treatment in treatments:
-                treatment_lower = treatment.lower()
-                
-                # Check primary exclusions in treatments
-                for exclusion_type, keywords in primary_exclusions.items():
-                    for keyword in keywords:
-                        if keyword in treatment_lower:
-                            # If treatment contains primary exclusion, check if it's the MAIN treatment
-                            # For TC009, "Bariatric consultation and diet plan" is PRIMARY
-                            excluded_items.append(treatment)
-                            primary_excluded = True
-                            break
-                
-                # Check secondary exclusions (cosmetic procedures)
-                for exclusion_type, keywords in secondary_exclusions.items():
-                    for keyword in keywords:
-                        if keyword in treatment_lower:
-                            partial_exclusions.append(treatment)
-                            break
+        for treatment in claim.treatments:
+            # Check primary exclusions in treatments
+            # For TC009, "Bariatric consultation and diet plan" is PRIMARY
+            if PRIMARY_EXCLUSION_GROUPS.search(treatment):
+                excluded_items.append(treatment)
+                primary_excluded = True
+            
+            # Check secondary exclusions (cosmetic procedures)
+            if SECONDARY_EXCLUSION_GROUPS.search(treatment):
+                partial_exclusions.append(treatment)
         
         # If primary treatment is excluded, entire claim is not covered
         if primary_excluded:
@@ -165,7 +273,7 @@ class PolicyValidator:
         # If only secondary items are excluded, claim is partially covered
         if partial_exclusions:
             excluded_items.extend(partial_exclusions)
-            category = self.determine_claim_category(diagnosis, treatments)
+            category = self.determine_claim_category(claim)
             return {
                 "covered": True,
                 "excluded_items": excluded_items,
@@ -174,7 +282,7 @@ class PolicyValidator:
             }
         
         # Determine category
-        category = self.determine_claim_category(diagnosis, treatments)
+        category = self.determine_claim_category(claim)
         
         return {
             "covered": True,
@@ -183,36 +291,20 @@ class PolicyValidator:
             "partial_coverage": False
         }
     
-    def determine_claim_category(self, diagnosis, treatments):
+    def determine_claim_category(self, claim):
         """
         Determine which policy category the claim falls under
         
+        Args:
+            claim: NormalizedClaim
+        
         Returns:
             str: Category name (consultation_fees, dental, pharmacy, etc.)
         """
-        diagnosis_lower = diagnosis.lower() if diagnosis else ""
-        treatments_str = " ".join(treatments).lower() if treatments else ""
-        combined = diagnosis_lower + " " + treatments_str
-        
-        # Dental
-        dental_keywords = ["tooth", "dental", "root canal", "filling", "extraction", "decay"]
-        if any(kw in combined for kw in dental_keywords):
-            return "dental"
-        
-        # Vision
-        vision_keywords = ["eye", "vision", "glasses", "contact lens", "lasik"]
-        if any(kw in combined for kw in vision_keywords):
-            return "vision"
-        
-        # Alternative medicine
-        alt_keywords = ["ayurved", "homeopath", "unani", "panchakarma", "chronic joint"]
-        if any(kw in combined for kw in alt_keywords):
-            return "alternative_medicine"
-        
-        # Diagnostic tests (when primary complaint is test)
-        diagnostic_keywords = ["mri", "ct scan", "ultrasound", "x-ray"]
-        if any(kw in combined for kw in diagnostic_keywords):
-            return "diagnostic_tests"
+        # First category (in priority order) with a keyword in the diagnosis or treatments
+        category = CATEGORY_GROUPS.first_label(claim.diagnosis, *claim.treatments)
+        if category:
+            return category
         
         # Default to consultation
         return "consultation_fees"
@@ -229,30 +321,19 @@ class PolicyValidator:
         Returns:
             dict: {within_limits: bool, limit_type: str, max_allowed: float}
         """
-        coverage = self.policy["coverage_details"]
-        
         # Check minimum claim amount
-        min_claim = self.policy["claim_requirements"]["minimum_claim_amount"]
-        if claim_amount < min_claim:
+        if claim_amount < self._min_claim:
             return {
                 "within_limits": False,
                 "limit_type": "BELOW_MIN_AMOUNT",
-                "max_allowed": min_claim
+                "max_allowed": self._min_claim
             }
         
         # KEY FIX: Check category sub-limit FIRST for specialized categories
         # Dental, vision, alternative medicine have their own higher sub-limits
         # These should be checked BEFORE the general per-claim limit
-        category_limits = {
-            "diagnostic_tests": coverage["diagnostic_tests"]["sub_limit"],
-            "pharmacy": coverage["pharmacy"]["sub_limit"],
-            "dental": coverage["dental"]["sub_limit"],
-            "vision": coverage["vision"]["sub_limit"],
-            "alternative_medicine": coverage["alternative_medicine"]["sub_limit"]
-        }
-        
-        if category in category_limits:
-            sub_limit = category_limits[category]
+        sub_limit = self._category_sub_limits.get(category)
+        if sub_limit is not None:
             if claim_amount > sub_limit:
                 return {
                     "within_limits": False,
@@ -261,21 +342,20 @@ class PolicyValidator:
                 }
         else:
             # For consultation_fees and other categories, check per-claim limit
-            per_claim_limit = coverage["per_claim_limit"]
-            if claim_amount > per_claim_limit:
+            if claim_amount > self._per_claim_limit:
                 return {
                     "within_limits": False,
                     "limit_type": "PER_CLAIM_EXCEEDED",
-                    "max_allowed": per_claim_limit
+                    "max_allowed": self._per_claim_limit
                 }
         
         # Check annual limit
         total_claims = member_previous_claims + claim_amount
-        if total_claims > coverage["annual_limit"]:
+        if total_claims > self._annual_limit:
             return {
                 "within_limits": False,
                 "limit_type": "ANNUAL_LIMIT_EXCEEDED",
-                "max_allowed": coverage["annual_limit"] - member_previous_claims
+                "max_allowed": self._annual_limit - member_previous_claims
             }
         
         return {"within_limits": True, "limit_type": None}
@@ -315,29 +395,14 @@ class PolicyValidator:
 
 
     
-    def requires_preauth(self, treatments, tests):
+    def requires_preauth(self, claim):
         """
         Check if pre-authorization is required
         
         Args:
-            treatments: List of treatments
-            tests: List of diagnostic tests
+            claim: NormalizedClaim (diagnostic tests and treatments)
             
         Returns:
             bool: True if pre-auth required
         """
-        preauth_tests = ["mri", "ct scan"]
-        
-        if tests:
-            for test in tests:
-                test_lower = test.lower()
-                if any(pat in test_lower for pat in preauth_tests):
-                    return True
-        
-        if treatments:
-            for treatment in treatments:
-                treatment_lower = treatment.lower()
-                if any(pat in treatment_lower for pat in preauth_tests):
-                    return True
-        
-        return False
\ No newline at end of file
+        return any(PREAUTH_PATTERN.search(item) for item in itertools.chain(claim.tests, claim.treatments))
@@ -0,0 +1,3 @@
+-- register_member relies on this constraint instead of a SELECT before insert:
+-- a duplicate member_id fails the insert with SQLSTATE 23505 (unique_violation).
+CREATE UNIQUE INDEX IF NOT EXISTS members_member_id_key ON members (member_id);
@@ -0,0 +1,27 @@
+-- Registers a member and writes its audit_log entry in a single call/transaction.
+-- Called by register_member as supabase.rpc("register_member_and_audit", {"p": member_data}).
+-- A duplicate member_id raises 23505 (unique_violation) and nothing is written.
+CREATE OR REPLACE FUNCTION register_member_and_audit(p jsonb)
+RETURNS SETOF members
+LANGUAGE plpgsql
+AS $$
+DECLARE
+    new_member members;
+BEGIN
+    INSERT INTO members (member_id, member_name, member_join_date, hospital, previous_claims_ytd, cashless_request)
+    VALUES (
+        p->>'member_id',
+        p->>'member_name',
+        (p->>'member_join_date')::date,
+        p->>'hospital',
+        COALESCE((p->>'previous_claims_ytd')::numeric, 0),
+        COALESCE((p->>'cashless_request')::boolean, false)
+    )
+    RETURNING * INTO new_member;
+
+    INSERT INTO audit_log (action_type, member_id, action_data)
+    VALUES ('member_registered', new_member.member_id, p);
+
+    RETURN NEXT new_member;
+END;
+$$;
@@ -0,0 +1,32 @@
+-- Stores a processed claim in one call/transaction: the claims row, its claim_details,
+-- the document_uploads rows and the audit_log entry.
+-- Called by upload_documents as supabase.rpc("insert_claim_bundle", {...}).
+-- Only the listed columns are taken from the payloads, so column defaults still apply.
+CREATE OR REPLACE FUNCTION insert_claim_bundle(claim jsonb, details jsonb, docs jsonb, audit jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    INSERT INTO claims (claim_id, member_id, treatment_date, claim_amount, decision,
+                        approved_amount, confidence_score, notes)
+    SELECT claim_id, member_id, treatment_date, claim_amount, decision,
+           approved_amount, confidence_score, notes
+    FROM jsonb_populate_record(NULL::claims, claim);
+
+    INSERT INTO claim_details (claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+                               network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text)
+    SELECT claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+           network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text
+    FROM jsonb_populate_record(NULL::claim_details, details);
+
+    INSERT INTO document_uploads (claim_id, document_type, original_filename, file_size_bytes,
+                                  upload_status, ocr_status, processed_at)
+    SELECT claim_id, document_type, original_filename, file_size_bytes,
+           upload_status, ocr_status, processed_at
+    FROM jsonb_populate_recordset(NULL::document_uploads, docs);
+
+    INSERT INTO audit_log (action_type, member_id, claim_id, action_data)
+    SELECT action_type, member_id, claim_id, action_data
+    FROM jsonb_populate_record(NULL::audit_log, audit);
+END;
+$$;
@@ -0,0 +1,35 @@
+-- insert_claim_bundle now verifies the claim's member inside the transaction and raises
+-- SQLSTATE P0002 (no_data_found) if it does not exist; upload_documents maps that to HTTP 404.
+CREATE OR REPLACE FUNCTION insert_claim_bundle(claim jsonb, details jsonb, docs jsonb, audit jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM 1 FROM members WHERE member_id = claim->>'member_id';
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Member % not found', claim->>'member_id' USING ERRCODE = 'P0002';
+    END IF;
+
+    INSERT INTO claims (claim_id, member_id, treatment_date, claim_amount, decision,
+                        approved_amount, confidence_score, notes)
+    SELECT claim_id, member_id, treatment_date, claim_amount, decision,
+           approved_amount, confidence_score, notes
+    FROM jsonb_populate_record(NULL::claims, claim);
+
+    INSERT INTO claim_details (claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+                               network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text)
+    SELECT claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+           network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text
+    FROM jsonb_populate_record(NULL::claim_details, details);
+
+    INSERT INTO document_uploads (claim_id, document_type, original_filename, file_size_bytes,
+                                  upload_status, ocr_status, processed_at)
+    SELECT claim_id, document_type, original_filename, file_size_bytes,
+           upload_status, ocr_status, processed_at
+    FROM jsonb_populate_recordset(NULL::document_uploads, docs);
+
+    INSERT INTO audit_log (action_type, member_id, claim_id, action_data)
+    SELECT action_type, member_id, claim_id, action_data
+    FROM jsonb_populate_record(NULL::audit_log, audit);
+END;
+$$;
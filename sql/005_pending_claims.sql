@@ -0,0 +1,81 @@
+-- Claims are accepted before OCR/adjudication runs: upload_documents creates a pending
+-- claim and returns 202, and a background task finalizes it once the decision is made.
+-- claims.status is 'processing' until then, 'completed' afterwards, or 'failed'.
+ALTER TABLE claims ADD COLUMN IF NOT EXISTS status text NOT NULL DEFAULT 'completed';
+ALTER TABLE claims ALTER COLUMN claim_amount DROP NOT NULL;
+ALTER TABLE claims ALTER COLUMN decision DROP NOT NULL;
+
+-- Creates the pending claims row and its document_uploads rows in one call/transaction.
+-- Raises SQLSTATE P0002 (no_data_found) if the member does not exist.
+-- Called by upload_documents as supabase.rpc("create_pending_claim", {...}).
+CREATE OR REPLACE FUNCTION create_pending_claim(claim jsonb, docs jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    PERFORM 1 FROM members WHERE member_id = claim->>'member_id';
+    IF NOT FOUND THEN
+        RAISE EXCEPTION 'Member % not found', claim->>'member_id' USING ERRCODE = 'P0002';
+    END IF;
+
+    INSERT INTO claims (claim_id, member_id, treatment_date, status)
+    SELECT claim_id, member_id, treatment_date, 'processing'
+    FROM jsonb_populate_record(NULL::claims, claim);
+
+    INSERT INTO document_uploads (claim_id, document_type, original_filename, file_size_bytes,
+                                  upload_status, ocr_status)
+    SELECT claim->>'claim_id', document_type, original_filename, file_size_bytes,
+           'processing', 'processing'
+    FROM jsonb_populate_recordset(NULL::document_uploads, docs);
+END;
+$$;
+
+-- Stores the decision for a pending claim in one call/transaction: updates the claims row,
+-- inserts claim_details and the audit_log entry, and marks its document_uploads completed.
+-- Called by the upload background task as supabase.rpc("finalize_claim", {...}).
+CREATE OR REPLACE FUNCTION finalize_claim(claim jsonb, details jsonb, audit jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE claims c
+    SET claim_amount = r.claim_amount,
+        decision = r.decision,
+        approved_amount = r.approved_amount,
+        confidence_score = r.confidence_score,
+        notes = r.notes,
+        status = 'completed',
+        processed_at = now()
+    FROM jsonb_populate_record(NULL::claims, claim) r
+    WHERE c.claim_id = r.claim_id;
+
+    INSERT INTO claim_details (claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+                               network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text)
+    SELECT claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+           network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text
+    FROM jsonb_populate_record(NULL::claim_details, details);
+
+    UPDATE document_uploads
+    SET upload_status = 'completed', ocr_status = 'completed', processed_at = now()
+    WHERE claim_id = claim->>'claim_id';
+
+    INSERT INTO audit_log (action_type, member_id, claim_id, action_data)
+    SELECT action_type, member_id, claim_id, action_data
+    FROM jsonb_populate_record(NULL::audit_log, audit);
+END;
+$$;
+
+-- Marks a pending claim and its document_uploads as failed.
+-- Called by the upload background task as supabase.rpc("fail_claim", {...}).
+CREATE OR REPLACE FUNCTION fail_claim(p_claim_id text, p_status text, p_reason text)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE claims SET status = p_status, notes = p_reason, processed_at = now()
+    WHERE claim_id = p_claim_id;
+
+    UPDATE document_uploads SET upload_status = 'failed', ocr_status = 'failed', processed_at = now()
+    WHERE claim_id = p_claim_id;
+END;
+$$;
@@ -0,0 +1,4 @@
+-- Supports keyset pagination in get_all_claims, which orders by
+-- (processed_at DESC, claim_id DESC) and seeks past the previous page's last row.
+CREATE INDEX IF NOT EXISTS claims_processed_at_claim_id_idx
+    ON claims (processed_at DESC, claim_id DESC);
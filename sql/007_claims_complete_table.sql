@@ -0,0 +1,57 @@
+-- claims_complete: v_claims_complete (claims + members + claim_details) stored as a table.
+-- The join runs once per claim, when finalize_claim stores the decision, instead of on
+-- every get_claim_result/get_all_claims read. Columns are copied from the view as-is.
+CREATE TABLE IF NOT EXISTS claims_complete AS
+SELECT * FROM v_claims_complete;
+
+-- Guarded so the migration can be re-run
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint
+        WHERE conrelid = 'claims_complete'::regclass AND contype = 'p'
+    ) THEN
+        ALTER TABLE claims_complete ADD PRIMARY KEY (claim_id);
+    END IF;
+END
+$$;
+
+-- Keyset pagination in get_all_claims (see 006_claims_keyset_index.sql)
+CREATE INDEX IF NOT EXISTS claims_complete_processed_at_claim_id_idx
+    ON claims_complete (processed_at DESC, claim_id DESC);
+
+-- Same as 005_pending_claims.sql, plus copying the finished claim into claims_complete.
+CREATE OR REPLACE FUNCTION finalize_claim(claim jsonb, details jsonb, audit jsonb)
+RETURNS void
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE claims c
+    SET claim_amount = r.claim_amount,
+        decision = r.decision,
+        approved_amount = r.approved_amount,
+        confidence_score = r.confidence_score,
+        notes = r.notes,
+        status = 'completed',
+        processed_at = now()
+    FROM jsonb_populate_record(NULL::claims, claim) r
+    WHERE c.claim_id = r.claim_id;
+
+    INSERT INTO claim_details (claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+                               network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text)
+    SELECT claim_id, rejection_reasons, flags, copay_amount, discount_amount,
+           network_discount, prescription_data, bill_data, test_report_data, raw_ocr_text
+    FROM jsonb_populate_record(NULL::claim_details, details);
+
+    UPDATE document_uploads
+    SET upload_status = 'completed', ocr_status = 'completed', processed_at = now()
+    WHERE claim_id = claim->>'claim_id';
+
+    INSERT INTO audit_log (action_type, member_id, claim_id, action_data)
+    SELECT action_type, member_id, claim_id, action_data
+    FROM jsonb_populate_record(NULL::audit_log, audit);
+
+    INSERT INTO claims_complete
+    SELECT * FROM v_claims_complete WHERE claim_id = claim->>'claim_id';
+END;
+$$;
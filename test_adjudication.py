@@ -0,0 +1,36 @@
+"""
+Adjudication test cases under pytest (one test per case)
+Run: pytest test_adjudication.py [-n auto]
+(pytest and pytest-xdist come with: pip install -r requirements-dev.txt)
+"""
+import pytest
+from adjudication_engine import ClaimAdjudicator
+from test_runner import load_test_cases, run_and_validate, run_cases
+
+
+@pytest.fixture(scope="session")
+def adjudicator():
+    """One adjudicator shared by all test cases (per worker under pytest-xdist)"""
+    return ClaimAdjudicator()
+
+
+@pytest.mark.parametrize("test_case", load_test_cases(), ids=lambda test_case: test_case["case_id"])
+def test_adjudication(test_case, adjudicator):
+    """Adjudicate one test case and check it against its expected output"""
+    passed, issues, _ = run_and_validate(test_case, adjudicator)
+    assert passed, "; ".join(issues)
+
+
+def _without_claim_ids(case_results):
+    """Case results with each decision's claim ID (allocated per process) dropped"""
+    return [
+        (passed, issues, decision and {key: value for key, value in decision.items() if key != "claim_id"})
+        for passed, issues, decision in case_results
+    ]
+
+
+def test_worker_pool_matches_serial():
+    """The worker-process path gives the same results as the in-process one"""
+    test_cases = load_test_cases()
+    pooled = run_cases(test_cases, min_parallel_cases=1, workers=2)
+    assert _without_claim_ids(pooled) == _without_claim_ids(run_cases(test_cases))
@@ -1,267 +1,439 @@
 """
 Comprehensive Test Runner with Detailed Output
 Run this to validate all test cases
+
+Per-test details are printed on a terminal or with --verbose; otherwise
+(e.g. output redirected in CI) only the results, tagged with their case IDs,
+and the summary are printed.
+
+The same cases run under pytest from test_adjudication.py.
 """
-import json
+import orjson
 from adjudication_engine import ClaimAdjudicator
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+import io
+import os
+import pickle
 import sys
+import tempfile
+from typing import Optional
+
+
+# Console separators
+BANNER = "🏥" * 50
+RULE = "=" * 100
+THIN_RULE = "-" * 100
+
+# Print per-test header, inputs and comparison
+VERBOSE = sys.stdout.isatty() or "--verbose" in sys.argv
+
+# Below this many cases, worker start-up (~300 ms) costs more than parallel
+# adjudication (~0.03 ms per case) saves, so they run in this process
+PARALLEL_MIN_CASES = 10_000
+
+# Parsed test cases, reused while test_cases.json is unchanged
+TEST_CASES_CACHE = "test_cases.json.cache.pkl"
 
 
 def load_test_cases():
-    """Load test cases from JSON file"""
+    """Load test cases and precompute the per-case data used by validate_result"""
+    test_cases = _read_test_cases()
+    for test_case in test_cases:
+        test_case["_claim_input"] = ClaimInput.from_input_data(test_case["input_data"])
+        expected = test_case["expected_output"]
+        expected["_validator"] = CaseValidator(expected)
+    return test_cases
+
+
+def _read_test_cases():
+    """Read test cases from JSON file (or its pickle cache if the file's mtime still matches)"""
     try:
-        with open("test_cases.json", 'r') as f:
-            data = json.load(f)
-            return data["test_cases"]
+        mtime_ns = os.stat("test_cases.json").st_mtime_ns
+        try:
+            with open(TEST_CASES_CACHE, 'rb') as f:
+                cached_mtime_ns, test_cases = pickle.load(f)
+            if cached_mtime_ns == mtime_ns:
+                return test_cases
+        except Exception:
+            pass  # missing, stale-format or corrupt cache: treat as a miss
+        
+        with open("test_cases.json", 'rb') as f:
+            test_cases = orjson.loads(f.read())["test_cases"]
+        
+        # Written to a temp file and renamed into place, so a concurrent or
+        # interrupted run never leaves a partial cache behind
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(TEST_CASES_CACHE)))
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    pickle.dump((mtime_ns, test_cases), f, protocol=5)
+                os.replace(tmp_path, TEST_CASES_CACHE)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except OSError:
+            pass
+        return test_cases
     except FileNotFoundError:
         print("❌ test_cases.json not found!")
         print("Please ensure test_cases.json is in the same directory")
         sys.exit(1)
 
 
-def run_test_case(test_case, adjudicator):
-    """Run a single test case and return results"""
-    case_id = test_case["case_id"]
-    input_data = test_case["input_data"]
-    expected = test_case["expected_output"]
+# Shared stand-ins for missing documents (the adjudicator only reads claim_data)
+_EMPTY = {}
+_EMPTY_LIST = []
+
+
+@dataclass(slots=True)
+class ClaimInput:
+    """A test case's input_data, parsed once by load_test_cases (defaults for omitted fields)"""
+    member_id: Optional[str] = None
+    member_name: Optional[str] = None
+    treatment_date: Optional[str] = None
+    claim_amount: Optional[float] = None
+    member_join_date: str = "2024-01-01"
+    previous_claims_same_day: int = 0
+    hospital: Optional[str] = None
+    cashless_request: bool = False
+    preauth_obtained: bool = False
+    prescription: dict = field(default_factory=dict)
+    bill: dict = field(default_factory=dict)
+    
+    @classmethod
+    def from_input_data(cls, input_data):
+        """Build from a test case's input_data"""
+        docs = input_data.get("documents") or _EMPTY
+        return cls(
+            prescription=docs.get("prescription") or _EMPTY,
+            bill=docs.get("bill") or _EMPTY,
+            **{key: input_data[key] for key in _CLAIM_INPUT_KEYS.intersection(input_data)}
+        )
+
+
+# ClaimInput fields read straight from input_data (documents are unpacked separately)
+_CLAIM_INPUT_KEYS = frozenset(ClaimInput.__dataclass_fields__) - {"prescription", "bill"}
+
+
+def run_and_validate(test_case, adjudicator):
+    """
+    Run a single test case and validate the decision
+    
+    Returns:
+        tuple: (passed, issues, decision); decision is None on a system error
+    """
+    claim_input = test_case["_claim_input"]
     
     # Convert input to claim_data format
     claim_data = {
-        "prescription": input_data.get("documents", {}).get("prescription", {}),
-        "bill": input_data.get("documents", {}).get("bill", {}),
-        "test_reports": []
+        "prescription": claim_input.prescription,
+        "bill": claim_input.bill,
+        "test_reports": _EMPTY_LIST
     }
     
     # Member info
     member_info = {
-        "member_id": input_data.get("member_id"),
-        "member_name": input_data.get("member_name"),
-        "treatment_date": input_data.get("treatment_date"),
-        "claim_amount": input_data.get("claim_amount"),
-        "member_join_date": input_data.get("member_join_date", "2024-01-01"),
+        "member_id": claim_input.member_id,
+        "member_name": claim_input.member_name,
+        "treatment_date": claim_input.treatment_date,
+        "claim_amount": claim_input.claim_amount,
+        "member_join_date": claim_input.member_join_date,
         "previous_claims_ytd": 0,
-        "previous_claims_same_day": input_data.get("previous_claims_same_day", 0),
-        "hospital": input_data.get("hospital"),
-        "cashless_request": input_data.get("cashless_request", False),
-        "preauth_obtained": input_data.get("preauth_obtained", False)
+        "previous_claims_same_day": claim_input.previous_claims_same_day,
+        "hospital": claim_input.hospital,
+        "cashless_request": claim_input.cashless_request,
+        "preauth_obtained": claim_input.preauth_obtained
     }
     
     # Run adjudication
     try:
         decision = adjudicator.adjudicate_claim(claim_data, member_info)
-        error = None
     except Exception as e:
-        decision = None
-        error = str(e)
-    
-    return {
-        "test_case": test_case,
-        "decision": decision,
-        "expected": expected,
-        "error": error
-    }
+        return False, [f"System Error: {str(e)}"], None
+    
+    passed, issues = validate_result(decision, test_case["expected_output"])
+    return passed, issues, decision
 
 
-def validate_result(decision, expected):
-    """Validate if decision matches expected output"""
-    if not decision:
-        return False, ["System error occurred"]
+# Adjudicator of the current worker process (see run_cases)
+_worker_adjudicator = None
+
+
+def _init_worker():
+    """Create the worker process's adjudicator"""
+    global _worker_adjudicator
+    _worker_adjudicator = ClaimAdjudicator()
+
+
+def _run_in_worker(test_case):
+    """Run and validate a single test case on the worker process's adjudicator"""
+    return run_and_validate(test_case, _worker_adjudicator)
+
+
+def run_cases(test_cases, min_parallel_cases=PARALLEL_MIN_CASES, workers=None):
+    """
+    Run and validate all test cases, in parallel worker processes (one
+    adjudicator each) once there are min_parallel_cases of them
     
-    issues = []
+    Args:
+        workers: Worker process count (default: one per CPU, at most one per case)
     
-    # Check decision type
-    if decision["decision"] != expected.get("decision"):
-        issues.append(f"Decision mismatch: expected {expected.get('decision')}, got {decision['decision']}")
+    Returns:
+        list: (passed, issues, decision) per test case, in test case order
+    """
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(test_cases))
+    if workers > 1 and len(test_cases) >= min_parallel_cases:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+            return list(executor.map(_run_in_worker, test_cases))
     
-    # Check approved amount
-    if expected.get("approved_amount") is not None:
-        expected_amt = expected["approved_amount"]
-        actual_amt = decision["approved_amount"]
-        
-        # Allow 10% tolerance
-        tolerance = max(expected_amt * 0.1, 100)
-        diff = abs(actual_amt - expected_amt)
-        
-        if diff > tolerance:
-            issues.append(f"Amount mismatch: expected ₹{expected_amt}, got ₹{actual_amt} (diff: ₹{diff:.2f})")
+    adjudicator = ClaimAdjudicator()
+    return [run_and_validate(test_case, adjudicator) for test_case in test_cases]
+
+
+def _amount_ok(expected_amt, actual_amt):
+    """Check an approved amount against the expected one (10% tolerance, at least ₹100)"""
+    diff = abs(actual_amt - expected_amt)
+    return diff <= max(expected_amt * 0.1, 100), diff
+
+
+def _check_decision(validator, decision, issues):
+    """Check decision type"""
+    if decision["decision"] != validator.expected_decision:
+        issues.append(f"Decision mismatch: expected {validator.expected_decision}, got {decision['decision']}")
+
+
+def _check_amount(validator, decision, issues):
+    """Check approved amount"""
+    expected_amt = validator.expected_amount
+    actual_amt = decision["approved_amount"]
     
-    # Check rejection reasons
-    if expected.get("rejection_reasons"):
-        expected_reasons = set(expected["rejection_reasons"])
-        actual_reasons = set(decision.get("rejection_reasons", []))
+    amount_ok, diff = _amount_ok(expected_amt, actual_amt)
+    if not amount_ok:
+        issues.append(f"Amount mismatch: expected ₹{expected_amt}, got ₹{actual_amt} (diff: ₹{diff:.2f})")
+
+
+def _check_reasons(validator, decision, issues):
+    """Check that at least one expected rejection reason was given"""
+    actual_reasons = decision.get("rejection_reasons", [])
+    if validator.expected_reasons.isdisjoint(actual_reasons):
+        issues.append(
+            f"Rejection reasons mismatch: expected {set(validator.expected_reasons)}, got {set(actual_reasons)}"
+        )
+
+
+class CaseValidator:
+    """
+    Result validation specialised for one test case's expected output
+    
+    Built once by load_test_cases, keeping only the checks that expected output
+    calls for (module-level functions, so test cases stay picklable for the pool).
+    """
+    __slots__ = ("expected_decision", "expected_amount", "expected_reasons", "checks")
+    
+    def __init__(self, expected):
+        self.expected_decision = expected.get("decision")
+        self.expected_amount = expected.get("approved_amount")
+        self.expected_reasons = frozenset(expected.get("rejection_reasons") or ())
         
-        if not expected_reasons.intersection(actual_reasons):
-            issues.append(f"Rejection reasons mismatch: expected {expected_reasons}, got {actual_reasons}")
+        checks = [_check_decision]
+        if self.expected_amount is not None:
+            checks.append(_check_amount)
+        if self.expected_reasons:
+            checks.append(_check_reasons)
+        self.checks = tuple(checks)
     
-    return len(issues) == 0, issues
+    def __call__(self, decision):
+        if not decision:
+            return False, ["System error occurred"]
+        
+        issues = []
+        for check in self.checks:
+            check(self, decision, issues)
+        return len(issues) == 0, issues
+
+
+def validate_result(decision, expected):
+    """Validate if decision matches expected output (with the validator load_test_cases built for it)"""
+    return expected["_validator"](decision)
 
 
-def print_test_header(case_num, total, test_case):
+def print_test_header(case_num, total, test_case, out=None):
     """Print formatted test header"""
-    print("\n" + "=" * 100)
-    print(f"TEST {case_num}/{total}: {test_case['case_name']} [{test_case['case_id']}]")
-    print("=" * 100)
-    print(f"📝 {test_case['description']}")
-    print("-" * 100)
+    if not VERBOSE:
+        return
+    print("\n" + RULE, file=out)
+    print(f"TEST {case_num}/{total}: {test_case['case_name']} [{test_case['case_id']}]", file=out)
+    print(RULE, file=out)
+    print(f"📝 {test_case['description']}", file=out)
+    print(THIN_RULE, file=out)
 
 
-def print_test_inputs(test_case):
+def print_test_inputs(test_case, out=None):
     """Print test inputs"""
+    if not VERBOSE:
+        return
     input_data = test_case["input_data"]
-    print("\n📥 INPUT:")
-    print(f"   Member: {input_data.get('member_name')} ({input_data.get('member_id')})")
-    print(f"   Treatment Date: {input_data.get('treatment_date')}")
-    print(f"   Claim Amount: ₹{input_data.get('claim_amount')}")
+    print("\n📥 INPUT:", file=out)
+    print(f"   Member: {input_data.get('member_name')} ({input_data.get('member_id')})", file=out)
+    print(f"   Treatment Date: {input_data.get('treatment_date')}", file=out)
+    print(f"   Claim Amount: ₹{input_data.get('claim_amount')}", file=out)
     
     docs = input_data.get("documents", {})
     if docs.get("prescription"):
         rx = docs["prescription"]
-        print(f"   Diagnosis: {rx.get('diagnosis', 'N/A')}")
-        print(f"   Doctor: {rx.get('doctor_name', 'N/A')} (Reg: {rx.get('doctor_reg', 'N/A')})")
+        print(f"   Diagnosis: {rx.get('diagnosis', 'N/A')}", file=out)
+        print(f"   Doctor: {rx.get('doctor_name', 'N/A')} (Reg: {rx.get('doctor_reg', 'N/A')})", file=out)
 
 
-def print_comparison(decision, expected):
+def print_comparison(decision, expected, out=None):
     """Print expected vs actual comparison"""
-    print("\n📊 COMPARISON:")
-    print(f"   Expected Decision: {expected.get('decision')}")
-    print(f"   Actual Decision:   {decision['decision']}")
+    if not VERBOSE:
+        return
+    lines = ["\n📊 COMPARISON:"]
+    lines.append(f"   Expected Decision: {expected.get('decision')}")
+    lines.append(f"   Actual Decision:   {decision['decision']}")
     
     if expected.get("approved_amount") is not None:
-        print(f"   Expected Amount:   ₹{expected['approved_amount']}")
-        print(f"   Actual Amount:     ₹{decision['approved_amount']}")
+        lines.append(f"   Expected Amount:   ₹{expected['approved_amount']}")
+        lines.append(f"   Actual Amount:     ₹{decision['approved_amount']}")
         
         if decision.get('deductions'):
             deductions = decision['deductions']
             if deductions.get('copay', 0) > 0:
-                print(f"   Copay Deduction:   ₹{deductions['copay']}")
+                lines.append(f"   Copay Deduction:   ₹{deductions['copay']}")
             if deductions.get('discount', 0) > 0:
-                print(f"   Network Discount:  ₹{deductions['discount']}")
+                lines.append(f"   Network Discount:  ₹{deductions['discount']}")
     
     if expected.get("rejection_reasons"):
-        print(f"   Expected Reasons:  {', '.join(expected['rejection_reasons'])}")
+        lines.append(f"   Expected Reasons:  {', '.join(expected['rejection_reasons'])}")
         if decision.get("rejection_reasons"):
-            print(f"   Actual Reasons:    {', '.join(decision['rejection_reasons'])}")
+            lines.append(f"   Actual Reasons:    {', '.join(decision['rejection_reasons'])}")
     
     if expected.get("flags"):
-        print(f"   Expected Flags:    {', '.join(expected['flags'])}")
+        lines.append(f"   Expected Flags:    {', '.join(expected['flags'])}")
         if decision.get("flags"):
-            print(f"   Actual Flags:      {', '.join(decision['flags'])}")
+            lines.append(f"   Actual Flags:      {', '.join(decision['flags'])}")
     
     if decision.get("rejected_items"):
-        print(f"   Rejected Items:    {', '.join(decision['rejected_items'])}")
+        lines.append(f"   Rejected Items:    {', '.join(decision['rejected_items'])}")
     
     if decision.get("notes"):
-        print(f"   Notes: {decision['notes']}")
+        lines.append(f"   Notes: {decision['notes']}")
     
-    print(f"   Confidence: {decision.get('confidence_score', 0):.2f}")
+    lines.append(f"   Confidence: {decision.get('confidence_score', 0):.2f}")
+    
+    print("\n".join(lines), file=out)
 
 
-def print_result(passed, issues):
-    """Print test result"""
+def print_result(passed, issues, case_id, out=None):
+    """Print test result (tagged with the case ID when the header was skipped)"""
+    tag = "" if VERBOSE else f" [{case_id}]"
     if passed:
-        print("\n✅ TEST PASSED")
+        print(f"\n✅ TEST PASSED{tag}", file=out)
     else:
-        print("\n❌ TEST FAILED")
-        print("\n⚠️  Issues:")
+        print(f"\n❌ TEST FAILED{tag}", file=out)
+        print("\n⚠️  Issues:", file=out)
         for issue in issues:
-            print(f"   • {issue}")
+            print(f"   • {issue}", file=out)
 
 
-def print_summary(results):
-    """Print overall summary"""
-    total = len(results)
-    passed = sum(1 for r in results if r["passed"])
+def print_summary(test_cases, passed_flags, out=None):
+    """Print overall summary (passed_flags: whether each of test_cases passed)"""
+    total = len(test_cases)
+    passed = sum(passed_flags)
     failed = total - passed
     
-    print("\n" + "=" * 100)
-    print("📊 TEST EXECUTION SUMMARY")
-    print("=" * 100)
-    print(f"\n   Total Tests:  {total}")
-    print(f"   ✅ Passed:     {passed} ({passed/total*100:.1f}%)")
-    print(f"   ❌ Failed:     {failed} ({failed/total*100:.1f}%)")
+    print("\n" + RULE, file=out)
+    print("📊 TEST EXECUTION SUMMARY", file=out)
+    print(RULE, file=out)
+    print(f"\n   Total Tests:  {total}", file=out)
+    print(f"   ✅ Passed:     {passed} ({passed/total*100:.1f}%)", file=out)
+    print(f"   ❌ Failed:     {failed} ({failed/total*100:.1f}%)", file=out)
     
     if failed > 0:
-        print(f"\n   Failed Tests:")
-        for r in results:
-            if not r["passed"]:
-                print(f"      • {r['test_case']['case_id']}: {r['test_case']['case_name']}")
+        print(f"\n   Failed Tests:", file=out)
+        for test_case, test_passed in zip(test_cases, passed_flags):
+            if not test_passed:
+                print(f"      • {test_case['case_id']}: {test_case['case_name']}", file=out)
     
-    print("\n" + "=" * 100)
+    print("\n" + RULE, file=out)
 
 
 def main():
     """Main test execution"""
-    print("\n" + "🏥" * 50)
+    print("\n" + BANNER)
     print("OPD CLAIM ADJUDICATION SYSTEM - COMPREHENSIVE TEST SUITE")
-    print("🏥" * 50)
+    print(BANNER)
     
     # Load test cases
     test_cases = load_test_cases()
     print(f"\n✓ Loaded {len(test_cases)} test cases")
     
-    # Initialize adjudicator
-    adjudicator = ClaimAdjudicator()
+    # Run tests; output is printed afterwards, in test case order
+    case_results = run_cases(test_cases)  # (passed, issues, decision)
     print("✓ Adjudication engine initialized")
     
-    # Run tests
-    results = []
+    # Results as parallel lists, indexed like test_cases
+    passed_flags = []
+    issues_list = []
     
-    for i, test_case in enumerate(test_cases, 1):
+    for i, (test_case, (passed, issues, decision)) in enumerate(zip(test_cases, case_results), 1):
+        # Each test's output is collected and written to stdout in one go
+        buf = io.StringIO()
+        
         # Print test header
-        print_test_header(i, len(test_cases), test_case)
+        print_test_header(i, len(test_cases), test_case, out=buf)
         
         # Print inputs
-        print_test_inputs(test_case)
-        
-        # Run test
-        result = run_test_case(test_case, adjudicator)
-        
-        # Validate
-        if result["error"]:
-            passed = False
-            issues = [f"System Error: {result['error']}"]
-        else:
-            passed, issues = validate_result(result["decision"], result["expected"])
+        print_test_inputs(test_case, out=buf)
         
         # Print comparison
-        if result["decision"]:
-            print_comparison(result["decision"], result["expected"])
+        if decision:
+            print_comparison(decision, test_case["expected_output"], out=buf)
         
         # Print result
-        print_result(passed, issues)
+        print_result(passed, issues, test_case["case_id"], out=buf)
+        sys.stdout.write(buf.getvalue())
         
         # Store result
-        results.append({
-            "test_case": test_case,
-            "passed": passed,
-            "issues": issues
-        })
+        passed_flags.append(passed)
+        issues_list.append(issues)
+    
+    passed_count = sum(passed_flags)
+    failed_count = len(passed_flags) - passed_count
     
     # Print summary
-    print_summary(results)
-    
-    # Save detailed report
-    report = {
-        "timestamp": datetime.now().isoformat(),
-        "total_tests": len(results),
-        "passed": sum(1 for r in results if r["passed"]),
-        "failed": sum(1 for r in results if not r["passed"]),
-        "results": [{
-            "case_id": r["test_case"]["case_id"],
-            "case_name": r["test_case"]["case_name"],
-            "passed": r["passed"],
-            "issues": r["issues"]
-        } for r in results]
-    }
+    buf = io.StringIO()
+    print_summary(test_cases, passed_flags, out=buf)
+    sys.stdout.write(buf.getvalue())
     
-    with open("test_report.json", 'w') as f:
-        json.dump(report, f, indent=2)
+    # Save detailed report, one result record at a time (same layout as an indented dump)
+    with open("test_report.json", 'wb') as f:
+        header = orjson.dumps({
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "total_tests": len(passed_flags),
+            "passed": passed_count,
+            "failed": failed_count
+        }, option=orjson.OPT_INDENT_2)
+        f.write(header[:-2] + b',\n  "results": [')
+        for n, (test_case, passed, issues) in enumerate(zip(test_cases, passed_flags, issues_list)):
+            record = orjson.dumps({
+                "case_id": test_case["case_id"],
+                "case_name": test_case["case_name"],
+                "passed": passed,
+                "issues": issues
+            }, option=orjson.OPT_INDENT_2)
+            f.write(b'\n    ' if n == 0 else b',\n    ')
+            f.write(record.replace(b'\n', b'\n    '))
+        f.write(b'\n  ]\n}' if passed_flags else b']\n}')
     
     print(f"\n💾 Detailed report saved to: test_report.json\n")
     
     # Exit with appropriate code
-    sys.exit(0 if all(r["passed"] for r in results) else 1)
+    sys.exit(1 if failed_count else 0)
 
 
 if __name__ == "__main__":